@@ -1,57 +1,98 @@
-import subprocess
-import json
+import boto3
 import csv
-
-class Vulnerability:
-    def __init__(self, repo_name="", pack_name="", pack_version="", image_id="", uri=""):
-        self.repo_name = repo_name
-        self.pack_name = pack_name
-        self.pack_version = pack_version
-        self.image_id = image_id
-        self.uri = uri
-
-def run_cmd(cmd):
-    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-    if result.returncode != 0:
-        print(f"Error running: {cmd}\n{result.stderr}")
-        return None
-    return result.stdout.strip()
+import time
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_WORKERS = 20        # Repos handled in parallel
+POLL_INTERVAL = 5       # Seconds before the first findings poll
+MAX_POLL_DELAY = 60     # Backoff cap between polls
+MAX_POLL_ATTEMPTS = 20
+# Errors worth polling through; anything else (ScanNotFoundException for an
+# unsupported image, AccessDenied, ...) will not change by waiting
+TRANSIENT_ERROR_CODES = {"ThrottlingException", "ServerException", "ServiceUnavailableException"}
+
+# One client for the whole run: single credential resolution, pooled connections
+ecr = boto3.client("ecr", config=Config(
+    tcp_keepalive=True,
+    retries={"max_attempts": 10, "mode": "adaptive"},
+    max_pool_connections=MAX_WORKERS,
+))
 
 def get_all_repos():
-    output = run_cmd("aws ecr describe-repositories")
-    if not output: return []
-    repos = json.loads(output).get("repositories", [])
+    repos = []
+    try:
+        for page in ecr.get_paginator("describe_repositories").paginate():
+            repos.extend(page.get("repositories", []))
+    except ClientError as e:
+        print(f"Error listing repositories: {e}")
     print(f'Number of repos: {len(repos)}')
     return repos
 
 def get_latest_img_digest(repo_name):
-    cmd = f"aws ecr describe-images --repository-name {repo_name} --query 'sort_by(imageDetails,& imagePushedAt)[-1].imageDigest' --output text"
-    return run_cmd(cmd)
+    images = []
+    try:
+        for page in ecr.get_paginator("describe_images").paginate(repositoryName=repo_name):
+            images.extend(page.get("imageDetails", []))
+    except ClientError as e:
+        print(f"Error describing images for {repo_name}: {e}")
+        return None
+    if not images:
+        return None
+    return max(images, key=lambda d: d["imagePushedAt"])["imageDigest"]
 
 def start_scanning(repo_name, image_digest):
-    cmd = f"aws ecr start-image-scan --repository-name {repo_name} --image-id imageDigest={image_digest}"
-    return run_cmd(cmd)
-
-def wait_scan_results(repo_name, image_digest):
-    cmd = f"aws ecr wait image-scan-complete --repository-name {repo_name} --image-id imageDigest={image_digest}"
-    return run_cmd(cmd)
+    # True if there will be findings to wait for
+    try:
+        ecr.start_image_scan(repositoryName=repo_name, imageId={"imageDigest": image_digest})
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "LimitExceededException":
+            # Already scanned in the last 24h; its findings can still be read
+            print(f"ℹ️ {repo_name} was scanned recently, using its latest findings")
+            return True
+        print(f"Error starting scan for {repo_name}: {e}")
+        return False
 
 def get_scan_result(repo_name, image_digest):
-    cmd = f"aws ecr describe-image-scan-findings --repository-name {repo_name} --image-id imageDigest={image_digest}"
-    output = run_cmd(cmd)
-    return json.loads(output) if output else {}
+    result = {}
+    findings = []
+    try:
+        paginator = ecr.get_paginator("describe_image_scan_findings")
+        for page in paginator.paginate(repositoryName=repo_name, imageId={"imageDigest": image_digest}):
+            result["imageScanStatus"] = page.get("imageScanStatus", {})
+            findings.extend(page.get("imageScanFindings", {}).get("findings", []))
+    except ClientError as e:
+        # Transient errors read as "still running"; the rest are for the caller
+        if e.response["Error"]["Code"] in TRANSIENT_ERROR_CODES:
+            return {}
+        raise
+    result["imageScanFindings"] = {"findings": findings}
+    return result
+
+def wait_scan_results(repo_name, image_digest):
+    # Poll the findings with exponential backoff until the scan is no longer running
+    for attempt in range(MAX_POLL_ATTEMPTS):
+        time.sleep(min(MAX_POLL_DELAY, POLL_INTERVAL * 2 ** attempt))
+        try:
+            result = get_scan_result(repo_name, image_digest)
+        except ClientError as e:
+            print(f"Error reading scan findings for {repo_name}: {e}")
+            return {}
+        status = result.get("imageScanStatus", {}).get("status")
+        if status and status not in ("IN_PROGRESS", "PENDING"):
+            return result
+    print(f"⚠️ Timed out waiting for scan of {repo_name}")
+    return {}
 
 def finding_vulnerabilities(repo_name, json_result):
+    # Returns (repo, package_name, package_version, uri) rows for CRITICAL findings
     vulns = []
     for result in json_result.get('imageScanFindings', {}).get('findings', []):
         if result.get('severity') == "CRITICAL":
-            v = Vulnerability(repo_name=repo_name, uri=result.get('uri', ''))
-            for att in result.get("attributes", []):
-                if att["key"] == "package_name":
-                    v.pack_name = att["value"]
-                if att["key"] == "package_version":
-                    v.pack_version = att["value"]
-            vulns.append(v)
+            attrs = {a["key"]: a["value"] for a in result.get("attributes", [])}
+            vulns.append((repo_name, attrs.get("package_name", ""), attrs.get("package_version", ""), result.get('uri', '')))
     return vulns
 
 def write_to_csv(vulns):
@@ -59,24 +100,33 @@ def write_to_csv(vulns):
     with open("repo_with_CRITICAL_issues.csv", 'w', newline='', encoding='utf8') as f:
         writer = csv.writer(f)
         writer.writerow(["Repo","package_name","version","uri"])
-        for v in vulns:
-            writer.writerow([v.repo_name, v.pack_name, v.pack_version, v.uri])
+        writer.writerows(vulns)
 
 def main():
     critical_vulns = []
-    for repo in get_all_repos():
-        repo_name = repo["repositoryName"]
-        print(f"\n--- Scanning repo: {repo_name} ---")
+    repo_names = [repo["repositoryName"] for repo in get_all_repos()]
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        digests = list(ex.map(get_latest_img_digest, repo_names))
 
-        image_digest = get_latest_img_digest(repo_name)
+    scan_repos, scan_digests = [], []
+    for repo_name, image_digest in zip(repo_names, digests):
         if not image_digest:
             print(f"⚠️ No images found for {repo_name}")
             continue
-
-        start_scanning(repo_name, image_digest)
-        wait_scan_results(repo_name, image_digest)
-
-        result = get_scan_result(repo_name, image_digest)
+        scan_repos.append(repo_name)
+        scan_digests.append(image_digest)
+
+    # Start every scan first, then wait on all of them concurrently;
+    # repos whose scan could not be started are not waited on
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        started = list(ex.map(start_scanning, scan_repos, scan_digests))
+        scan_repos = [r for r, ok in zip(scan_repos, started) if ok]
+        scan_digests = [d for d, ok in zip(scan_digests, started) if ok]
+        print(f"\n--- Started scans for {len(scan_repos)} repos, waiting for results ---")
+        results = list(ex.map(wait_scan_results, scan_repos, scan_digests))
+
+    for repo_name, result in zip(scan_repos, results):
         if result.get("imageScanStatus", {}).get("status") == "FAILED":
             print(f"❌ Scan failed for {repo_name}")
             continue
@@ -1,14 +1,21 @@
 import boto3
 import csv
+from botocore.config import Config
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
 
+# Keep-alive connections and adaptive retries for every client
+BOTO_CONFIG = Config(
+    tcp_keepalive=True,
+    retries={"max_attempts": 10, "mode": "adaptive"},
+    max_pool_connections=50,
+    connect_timeout=5,
+    read_timeout=30,
+)
+
 def get_name_tag(tags):
-    if not tags:
-        return ""
-    for t in tags:
-        if t["Key"] == "Name":
-            return t["Value"]
-    return ""
+    return {t["Key"]: t["Value"] for t in tags or []}.get("Name", "")
 
 def list_unused_volumes(ec2):
     unused_vols = []
@@ -23,15 +30,30 @@ def list_unused_volumes(ec2):
             })
     return unused_vols
 
+def start_time_patterns(cutoff, first_year=2008):
+    # start-time filter values (wildcards only, no "<") covering everything up to
+    # and including the cutoff day; EBS snapshots date back to 2008
+    patterns = [f"{y}-*" for y in range(first_year, cutoff.year)]
+    patterns += [f"{cutoff.year}-{m:02d}-*" for m in range(1, cutoff.month)]
+    patterns += [f"{cutoff.year}-{cutoff.month:02d}-{d:02d}*" for d in range(1, cutoff.day + 1)]
+    return patterns
+
 def list_old_snapshots(ec2_client, days_old=90):
     old_snaps = []
     cutoff = datetime.now(timezone.utc) - timedelta(days=days_old)
-    snapshots = ec2_client.describe_snapshots(OwnerIds=['self'])["Snapshots"]
+    paginator = ec2_client.get_paginator("describe_snapshots")
+    pages = paginator.paginate(
+        OwnerIds=['self'],
+        Filters=[{"Name": "start-time", "Values": start_time_patterns(cutoff)}],
+        PaginationConfig={"PageSize": 1000},
+    )
+    snapshots = (snap for page in pages for snap in page["Snapshots"])
     for snap in snapshots:
+        # The filter works at day granularity; the cutoff day still needs the exact check
         if snap["StartTime"] < cutoff:
             old_snaps.append({
                 "ResourceType": "EBS Snapshot",
-                "Name": (snap.get("Tags", [{}])[0].get("Value","") if snap.get("Tags") else ""),
+                "Name": get_name_tag(snap.get("Tags")),
                 "ResourceId": snap["SnapshotId"],
                 "Details": f"Volume={snap.get('VolumeId','N/A')}, Size={snap['VolumeSize']}GiB, Started={snap['StartTime'].strftime('%Y-%m-%d')}",
                 "Severity": "Medium"
@@ -52,6 +74,9 @@ def list_unattached_eips(ec2_client):
             })
     return eips
 
+def get_target_health(elbv2_client, tg_arn):
+    return elbv2_client.describe_target_health(TargetGroupArn=tg_arn)["TargetHealthDescriptions"]
+
 def list_unused_load_balancers(elb_client, elbv2_client):
     unused = []
     lbs = elb_client.describe_load_balancers()["LoadBalancerDescriptions"]
@@ -65,19 +90,30 @@ def list_unused_load_balancers(elb_client, elbv2_client):
                 "Severity": "High"
             })
     lbs_v2 = elbv2_client.describe_load_balancers()["LoadBalancers"]
+
+    # List every target group once and group them by load balancer
+    tgs_by_lb = defaultdict(list)
+    for page in elbv2_client.get_paginator("describe_target_groups").paginate():
+        for tg in page["TargetGroups"]:
+            for lb_arn in tg.get("LoadBalancerArns", []):
+                tgs_by_lb[lb_arn].append(tg["TargetGroupArn"])
+
+    # Health checks are per target group; run them in parallel
+    tg_arns = sorted({arn for arns in tgs_by_lb.values() for arn in arns})
+    with ThreadPoolExecutor(max_workers=10) as ex:
+        health = dict(zip(tg_arns, ex.map(lambda arn: get_target_health(elbv2_client, arn), tg_arns)))
+
     for lb in lbs_v2:
-        tg_resp = elbv2_client.describe_target_groups(LoadBalancerArn=lb["LoadBalancerArn"])
-        if tg_resp["TargetGroups"]:
-            tg_arn = tg_resp["TargetGroups"][0]["TargetGroupArn"]
-            tg = elbv2_client.describe_target_health(TargetGroupArn=tg_arn)
-            if not tg["TargetHealthDescriptions"]:
-                unused.append({
-                    "ResourceType": f"{lb['Type']} Load Balancer",
-                    "Name": lb["LoadBalancerName"],
-                    "ResourceId": lb["LoadBalancerArn"],
-                    "Details": "No targets registered",
-                    "Severity": "High"
-                })
+        lb_tgs = tgs_by_lb.get(lb["LoadBalancerArn"])
+        # Unused when none of its target groups has a registered target
+        if lb_tgs and not any(health[arn] for arn in lb_tgs):
+            unused.append({
+                "ResourceType": f"{lb['Type']} Load Balancer",
+                "Name": lb["LoadBalancerName"],
+                "ResourceId": lb["LoadBalancerArn"],
+                "Details": "No targets registered",
+                "Severity": "High"
+            })
     return unused
 
 def list_idle_rds(rds_client):
@@ -92,7 +128,7 @@ def list_idle_rds(rds_client):
 
         idle.append({
             "ResourceType": "RDS Instance",
-            "Name": next((t["Value"] for t in db.get("TagList", []) if t["Key"]=="Name"), ""),
+            "Name": get_name_tag(db.get("TagList")),
             "ResourceId": db["DBInstanceIdentifier"],
             "Details": f"{db['Engine']} {db['DBInstanceClass']} Status={db['DBInstanceStatus']} Storage={db['AllocatedStorage']}GiB",
             "Severity": sev
@@ -104,7 +140,7 @@ def list_stopped_instances(ec2_client):
     reservations = ec2_client.describe_instances(Filters=[{"Name":"instance-state-name","Values":["stopped"]}])["Reservations"]
     for res in reservations:
         for inst in res["Instances"]:
-            name = next((t["Value"] for t in inst.get("Tags",[]) if t["Key"]=="Name"), "")
+            name = get_name_tag(inst.get("Tags"))
             stopped.append({
                 "ResourceType": "EC2 Instance",
                 "Name": name,
@@ -126,11 +162,11 @@ def save_to_csv(filename, data, fieldnames):
 
 def main():
     session = boto3.Session()
-    ec2 = session.resource("ec2")
-    ec2_client = session.client("ec2")
-    elb_client = session.client("elb")
-    elbv2_client = session.client("elbv2")
-    rds_client = session.client("rds")
+    ec2 = session.resource("ec2", config=BOTO_CONFIG)
+    ec2_client = session.client("ec2", config=BOTO_CONFIG)
+    elb_client = session.client("elb", config=BOTO_CONFIG)
+    elbv2_client = session.client("elbv2", config=BOTO_CONFIG)
+    rds_client = session.client("rds", config=BOTO_CONFIG)
 
     master_list = []
 
@@ -4,19 +4,76 @@
 EC2 inventory:
 - Scans all enabled regions
 - Gathers rich EC2 details, SGs, ENIs, volumes, tags
-- Writes CSV and Excel (table format)
+- Writes CSV and Excel (filterable sheet), streaming one region at a time
+- Caches AMI names for 24h between runs (.ami_cache.db in the output directory)
 
 Usage:
-  pip install boto3 pandas xlsxwriter
+  pip install boto3 numpy pandas xlsxwriter
+  pip install pyarrow              # optional, faster CSV writing
   python ec2_inventory.py          # uses default AWS creds/role/profile
   AWS_PROFILE=yourprofile python ec2_inventory.py
+  python ec2_inventory.py --output-dir reports --ami-cache ~/.cache/ec2_ami_cache.db
 """
 
+import argparse
 import boto3
 import botocore
+from botocore.config import Config
+import numpy as np
 import pandas as pd
+import xlsxwriter
 from datetime import datetime, timezone
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+import atexit
+import os
+import tempfile
+import shelve
+import time
+from functools import lru_cache
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.feather as pa_feather
+except ImportError:  # optional: faster CSV writer
+    pa = None
+
+# Keep-alive connections and adaptive retries for every client
+BOTO_CONFIG = Config(
+    tcp_keepalive=True,
+    retries={"max_attempts": 10, "mode": "adaptive"},
+    max_pool_connections=50,
+    connect_timeout=5,
+    read_timeout=30,
+)
+
+# boto3 sessions are not thread-safe while building clients
+_client_lock = threading.Lock()
+
+# AMI names are effectively immutable, so cache them on disk between runs
+AMI_CACHE_FILE = ".ami_cache.db"  # default name, inside the output directory
+_ami_cache_path = AMI_CACHE_FILE  # set from the CLI in main()
+AMI_CACHE_TTL = 24 * 3600  # seconds
+_ami_cache = None
+_ami_cache_lock = threading.Lock()
+
+PAGE_SIZE = 1000  # max page size for describe_instances
+VOLUMES_PAGE_SIZE = 500  # describe_volumes caps pages at 500
+
+AUTOFIT_SAMPLE_ROWS = 1000  # rows sampled when sizing Excel columns
+
+# Output column order; tag_* columns follow
+CORE_COLS = [
+    "AccountId","Region","InstanceId","Name","State","Platform","Architecture","Hypervisor",
+    "ImageId","ImageName","InstanceType","CPU_Cores","CPU_ThreadsPerCore",
+    "AvailabilityZone","Tenancy","PlacementGroup",
+    "PrivateIpAddress","PrivateDnsName","PublicIpAddress","PublicDnsName",
+    "VpcId","SubnetId","IamInstanceProfileArn",
+    "RootDeviceName","RootDeviceType","EbsOptimized",
+    "LaunchTime","UptimeDays",
+    "SecurityGroupIds","SecurityGroupNames","BlockDeviceCount","Volumes","ENIs"
+]
 
 # ---------- Helpers ----------
 
@@ -38,250 +95,351 @@ def days_between(start):
         return None
     return (datetime.now(timezone.utc) - start).days
 
-def flatten_tags(tags):
-    # Returns dict like {"tag_Name":"web", "tag_Env":"prod"}
-    out = {}
-    if isinstance(tags, list):
-        for t in tags:
-            k = t.get("Key")
-            v = t.get("Value")
-            if k:
-                out[f"tag_{k}"] = v
-    return out
+def tags_frame(tags):
+    # Expands a Series of AWS tag lists into tag_<Key> columns aligned on its index
+    pairs = tags.explode().dropna()
+    if pairs.empty:
+        return pd.DataFrame(index=tags.index)
+    kv = pd.DataFrame(pairs.tolist(), index=pairs.index)
+    kv = kv[kv["Key"].astype(bool)]
+    wide = kv.set_index("Key", append=True)["Value"].unstack()
+    wide.columns.name = None
+    return wide.add_prefix("tag_")
+
+def _get_ami_cache():
+    # Opened lazily, closed (and flushed) at interpreter exit
+    global _ami_cache
+    if _ami_cache is None:
+        _ami_cache = shelve.open(_ami_cache_path)
+        atexit.register(_ami_cache.close)
+    return _ami_cache
+
+@lru_cache(maxsize=None)
+def _ami_name(region, image_id):
+    # Cached AMI name; raises KeyError on a miss so misses are not memoized
+    with _ami_cache_lock:
+        entry = _get_ami_cache().get(f"{region}:{image_id}")
+    if entry is None or time.time() - entry[1] > AMI_CACHE_TTL:
+        raise KeyError(image_id)
+    return entry[0]
 
 def get_ami_names(ec2_client, image_ids):
     # Batch-fetch AMI names; returns dict: {imageId: name}
     ami_map = {}
     if not image_ids:
         return ami_map
+    region = ec2_client.meta.region_name
+    misses = []
+    for image_id in {i for i in image_ids if i}:
+        try:
+            ami_map[image_id] = _ami_name(region, image_id)
+        except KeyError:
+            misses.append(image_id)
     # API allows up to 100 image IDs per call
-    ids = list({i for i in image_ids if i})
-    for i in range(0, len(ids), 100):
-        chunk = ids[i:i+100]
+    for i in range(0, len(misses), 100):
+        chunk = misses[i:i+100]
         try:
             resp = ec2_client.describe_images(ImageIds=chunk)
-            for img in resp.get("Images", []):
-                ami_map[img["ImageId"]] = img.get("Name")
         except botocore.exceptions.ClientError:
             # Some AMIs may be owned by other accounts/marketplace; ignore if access denied
             continue
+        now = time.time()
+        with _ami_cache_lock:
+            cache = _get_ami_cache()
+            for img in resp.get("Images", []):
+                ami_map[img["ImageId"]] = img.get("Name")
+                cache[f"{region}:{img['ImageId']}"] = (img.get("Name"), now)
     return ami_map
 
-def volumes_by_instance(ec2_client, instance_ids):
-    # Map instanceId -> list of volume dicts
-    result = defaultdict(list)
+def _int_text(col):
+    # Integer column as text without a trailing ".0"; missing values stay missing
+    return col.astype("Int64").astype(str).where(col.notna())
+
+def volume_summaries(ec2_client, instance_ids):
+    # Map instanceId -> "vol-1(8GiB gp3 3000iops 125MB/s, /dev/xvda); ..." summary
     if not instance_ids:
-        return result
+        return {}
     paginator = ec2_client.get_paginator("describe_volumes")
     try:
-        for page in paginator.paginate(
-            Filters=[{"Name":"attachment.instance-id", "Values":instance_ids}]
-        ):
-            for vol in page.get("Volumes", []):
-                for att in vol.get("Attachments", []):
-                    iid = att.get("InstanceId")
-                    if iid:
-                        result[iid].append({
-                            "VolumeId": vol.get("VolumeId"),
-                            "SizeGiB": vol.get("Size"),
-                            "VolumeType": vol.get("VolumeType"),
-                            "Iops": vol.get("Iops"),
-                            "Throughput": vol.get("Throughput"),
-                            "Encrypted": vol.get("Encrypted"),
-                            "KmsKeyId": vol.get("KmsKeyId"),
-                            "DeviceName": att.get("Device"),
-                            "DeleteOnTermination": att.get("DeleteOnTermination"),
-                            "AttachTime": iso_or_none(att.get("AttachTime")),
-                        })
+        vols = pd.DataFrame([
+            {
+                "InstanceId": att["InstanceId"],
+                "VolumeId": vol.get("VolumeId"),
+                "Size": vol.get("Size"),
+                "VolumeType": vol.get("VolumeType"),
+                "Iops": vol.get("Iops"),
+                "Throughput": vol.get("Throughput"),
+                "DeviceName": att.get("Device"),
+            }
+            for page in paginator.paginate(
+                Filters=[{"Name":"attachment.instance-id", "Values":instance_ids}],
+                PaginationConfig={"PageSize": VOLUMES_PAGE_SIZE},
+            )
+            for vol in page.get("Volumes", [])
+            for att in vol.get("Attachments", [])
+            if att.get("InstanceId")
+        ], columns=["InstanceId","VolumeId","Size","VolumeType","Iops","Throughput","DeviceName"])
     except botocore.exceptions.ClientError:
-        pass
-    return result
-
-def enis_by_instance(ec2_client, instance_ids):
-    # Map instanceId -> list of ENI dicts
-    result = defaultdict(list)
-    if not instance_ids:
-        return result
-    paginator = ec2_client.get_paginator("describe_network_interfaces")
+        return {}
+    if vols.empty:
+        return {}
+
+    # Build every volume label with column-wise string ops, then join per instance
+    iops = (" " + _int_text(vols["Iops"]) + "iops").fillna("")
+    throughput = (" " + _int_text(vols["Throughput"]) + "MB/s").fillna("")
+    vols["Label"] = (
+        vols["VolumeId"].astype(str) + "(" + _int_text(vols["Size"]).fillna("None") + "GiB "
+        + vols["VolumeType"].astype(str) + iops + throughput
+        + ", " + vols["DeviceName"].astype(str) + ")"
+    )
+    return vols.groupby("InstanceId", sort=False)["Label"].agg("; ".join).to_dict()
+
+@lru_cache(maxsize=1)
+def get_account_id():
+    return boto3.client("sts", config=BOTO_CONFIG).get_caller_identity()["Account"]
+
+@lru_cache(maxsize=1)
+def enabled_regions():
+    # All regions enabled for the account
+    ec2_global = boto3.client("ec2", region_name="us-east-1", config=BOTO_CONFIG)
+    return [r["RegionName"] for r in ec2_global.describe_regions(AllRegions=False)["Regions"]]
+
+def arrow_table(df):
+    # df as an Arrow table, or None if pyarrow is missing or cannot convert it
+    if pa is None:
+        return None
     try:
-        for page in paginator.paginate(
-            Filters=[{"Name": "attachment.instance-id", "Values": instance_ids}]
-        ):
-            for eni in page.get("NetworkInterfaces", []):
-                result[safe_get(eni, "Attachment", "InstanceId")].append({
-                    "NetworkInterfaceId": eni.get("NetworkInterfaceId"),
-                    "MacAddress": eni.get("MacAddress"),
-                    "PrivateIpAddress": eni.get("PrivateIpAddress"),
-                    "PrivateDnsName": eni.get("PrivateDnsName"),
-                    "PublicIp": safe_get(eni, "Association", "PublicIp"),
-                    "PublicDnsName": safe_get(eni, "Association", "PublicDnsName"),
-                    "InterfaceType": eni.get("InterfaceType"),
-                    "Status": eni.get("Status"),
-                    "SubnetId": eni.get("SubnetId"),
-                    "VpcId": eni.get("VpcId"),
-                })
-    except botocore.exceptions.ClientError:
-        pass
-    return result
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return None
 
-# ---------- Main ----------
+def write_arrow_csv(table, columns, f, header=True):
+    # pyarrow's C++ CSV writer over the full column set; columns this region
+    # lacks are written empty, as the pandas reindex does
+    cols = [table.column(c) if c in table.column_names else pa.nulls(table.num_rows)
+            for c in columns]
+    table = pa.Table.from_arrays(cols, names=columns)
+    pa_csv.write_csv(table, f, pa_csv.WriteOptions(include_header=header))
 
-def main():
-    session = boto3.Session()
-    sts = session.client("sts")
-    account_id = sts.get_caller_identity()["Account"]
-    ec2_global = session.client("ec2", region_name="us-east-1")
+def region_frame(rows):
+    # One region's rows as a DataFrame with tags expanded, in output order
+    df = pd.DataFrame(rows)
+    df = df.join(tags_frame(df.pop("Tags")))
+    return df.sort_values(["Name","InstanceId"], na_position="last")
+
+def column_widths(df):
+    # Approximate Excel column widths {column: width} from a sample of rows
+    sample = df.head(AUTOFIT_SAMPLE_ROWS).to_numpy(dtype=str)
+    widths = np.clip(np.char.str_len(sample).max(axis=0, initial=8) + 2, 10, 60)
+    return dict(zip(df.columns, widths.tolist()))
+
+def excel_rows(df):
+    # Plain Python values per row, missing cells as None, for xlsxwriter
+    return df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
 
-    # all enabled regions
-    regions = [r["RegionName"] for r in ec2_global.describe_regions(AllRegions=False)["Regions"]]
+# ---------- Per-region scan ----------
 
+def scan_region(session, region, account_id):
+    # Returns the inventory rows for one region; runs in a worker thread
     rows = []
+    with _client_lock:
+        ec2 = session.client("ec2", region_name=region, config=BOTO_CONFIG)
+
+    # Enumerate instances (running or any state)
+    paginator = ec2.get_paginator("describe_instances")
+    pages = iter(paginator.paginate(PaginationConfig={"PageSize": PAGE_SIZE}))
+    first_page = next(pages)
+    # Most enabled regions are empty; skip everything after the first page
+    if not first_page.get("Reservations") and not first_page.get("NextToken"):
+        return rows
+    reservations = list(first_page.get("Reservations", []))
+    for page in pages:
+        reservations.extend(page.get("Reservations", []))
+
+    # Gather for AMI and resource joining
+    instances = []
+    image_ids = set()
+    instance_ids = []
+
+    for res in reservations:
+        for inst in res.get("Instances", []):
+            instances.append(inst)
+            instance_ids.append(inst["InstanceId"])
+            img = inst.get("ImageId")
+            if img:
+                image_ids.add(img)
+
+    ami_names = get_ami_names(ec2, image_ids)
+    vol_summaries = volume_summaries(ec2, instance_ids)
+
+    for inst in instances:
+        iid = inst["InstanceId"]
+        tags = {t["Key"]: t["Value"] for t in inst.get("Tags") or []}
+        name_tag = tags.get("Name")
+
+        # Security groups (IDs + names)
+        sg_ids = []
+        sg_names = []
+        for sg in inst.get("SecurityGroups", []):
+            sg_ids.append(sg.get("GroupId"))
+            sg_names.append(sg.get("GroupName"))
+
+        # Root device info
+        block_map = inst.get("BlockDeviceMappings", []) or []
+        root_dev_name = inst.get("RootDeviceName")
+        root_dev_type = inst.get("RootDeviceType")
+
+        # ENIs summary (describe_instances already returns the attached ENIs)
+        eni_list = [{
+            "NetworkInterfaceId": eni.get("NetworkInterfaceId"),
+            "PrivateIpAddress": eni.get("PrivateIpAddress"),
+            "PublicIp": safe_get(eni, "Association", "PublicIp"),
+            "MacAddress": eni.get("MacAddress"),
+        } for eni in inst.get("NetworkInterfaces", [])]
+        eni_summary = "; ".join(
+            f"{e['NetworkInterfaceId']}({e['PrivateIpAddress']}"
+            + (f", pub:{e['PublicIp']}" if e.get('PublicIp') else "")
+            + f", mac:{e['MacAddress']})"
+            for e in eni_list
+        ) if eni_list else ""
+
+        launch_time = inst.get("LaunchTime")
+        row = {
+            "AccountId": account_id,
+            "Region": region,
+            "InstanceId": iid,
+            "Name": name_tag,
+            "State": safe_get(inst, "State", "Name"),
+            "Platform": inst.get("Platform") or "Linux/UNIX",
+            "Architecture": inst.get("Architecture"),
+            "Hypervisor": inst.get("Hypervisor"),
+            "ImageId": inst.get("ImageId"),
+            "ImageName": ami_names.get(inst.get("ImageId")),
+            "InstanceType": inst.get("InstanceType"),
+            "CPU_Cores": safe_get(inst, "CpuOptions", "CoreCount"),
+            "CPU_ThreadsPerCore": safe_get(inst, "CpuOptions", "ThreadsPerCore"),
+            "AvailabilityZone": safe_get(inst, "Placement", "AvailabilityZone"),
+            "Tenancy": safe_get(inst, "Placement", "Tenancy"),
+            "PlacementGroup": safe_get(inst, "Placement", "GroupName"),
+            "PrivateIpAddress": inst.get("PrivateIpAddress"),
+            "PrivateDnsName": inst.get("PrivateDnsName"),
+            "PublicIpAddress": inst.get("PublicIpAddress"),
+            "PublicDnsName": inst.get("PublicDnsName"),
+            "VpcId": inst.get("VpcId"),
+            "SubnetId": inst.get("SubnetId"),
+            "IamInstanceProfileArn": safe_get(inst, "IamInstanceProfile", "Arn"),
+            "RootDeviceName": root_dev_name,
+            "RootDeviceType": root_dev_type,
+            "EbsOptimized": inst.get("EbsOptimized"),
+            "LaunchTime": iso_or_none(launch_time),
+            "UptimeDays": days_between(launch_time),
+            "SecurityGroupIds": ", ".join(sg_ids) if sg_ids else None,
+            "SecurityGroupNames": ", ".join(sg_names) if sg_names else None,
+            "BlockDeviceCount": len(block_map),
+            "Volumes": vol_summaries.get(iid, ""),
+            "ENIs": eni_summary,
+            # Raw tag list; expanded into tag_* columns once all regions are in
+            "Tags": inst.get("Tags", []),
+        }
+        rows.append(row)
+
+    return rows
 
-    for region in regions:
-        ec2 = session.client("ec2", region_name=region)
-
-        # Enumerate instances (running or any state)
-        paginator = ec2.get_paginator("describe_instances")
-        reservations = []
-        for page in paginator.paginate():
-            reservations.extend(page.get("Reservations", []))
-
-        # Gather for AMI and resource joining
-        instances = []
-        image_ids = set()
-        instance_ids = []
-
-        for res in reservations:
-            for inst in res.get("Instances", []):
-                instances.append(inst)
-                instance_ids.append(inst["InstanceId"])
-                img = inst.get("ImageId")
-                if img:
-                    image_ids.add(img)
-
-        ami_names = get_ami_names(ec2, image_ids)
-        vols_map = volumes_by_instance(ec2, instance_ids)
-        enis_map = enis_by_instance(ec2, instance_ids)
-
-        for inst in instances:
-            iid = inst["InstanceId"]
-            name_tag = next((t["Value"] for t in inst.get("Tags", []) if t.get("Key") == "Name"), None)
-
-            # Security groups (IDs + names)
-            sg_ids = []
-            sg_names = []
-            for sg in inst.get("SecurityGroups", []):
-                sg_ids.append(sg.get("GroupId"))
-                sg_names.append(sg.get("GroupName"))
-
-            # Root device info
-            block_map = inst.get("BlockDeviceMappings", []) or []
-            root_dev_name = inst.get("RootDeviceName")
-            root_dev_type = inst.get("RootDeviceType")
-
-            # Volumes summary string
-            vol_list = vols_map.get(iid, [])
-            vol_summary = "; ".join(
-                f"{v['VolumeId']}({v['SizeGiB']}GiB {v['VolumeType']}"
-                + (f" {v['Iops']}iops" if v.get('Iops') is not None else "")
-                + (f" {v['Throughput']}MB/s" if v.get('Throughput') is not None else "")
-                + f", {v['DeviceName']})"
-                for v in vol_list
-            ) if vol_list else ""
-
-            # ENIs summary
-            eni_list = enis_map.get(iid, [])
-            eni_summary = "; ".join(
-                f"{e['NetworkInterfaceId']}({e['PrivateIpAddress']}"
-                + (f", pub:{e['PublicIp']}" if e.get('PublicIp') else "")
-                + f", mac:{e['MacAddress']})"
-                for e in eni_list
-            ) if eni_list else ""
-
-            launch_time = inst.get("LaunchTime")
-            row = {
-                "AccountId": account_id,
-                "Region": region,
-                "InstanceId": iid,
-                "Name": name_tag,
-                "State": safe_get(inst, "State", "Name"),
-                "Platform": inst.get("Platform") or "Linux/UNIX",
-                "Architecture": inst.get("Architecture"),
-                "Hypervisor": inst.get("Hypervisor"),
-                "ImageId": inst.get("ImageId"),
-                "ImageName": ami_names.get(inst.get("ImageId")),
-                "InstanceType": inst.get("InstanceType"),
-                "CPU_Cores": safe_get(inst, "CpuOptions", "CoreCount"),
-                "CPU_ThreadsPerCore": safe_get(inst, "CpuOptions", "ThreadsPerCore"),
-                "AvailabilityZone": safe_get(inst, "Placement", "AvailabilityZone"),
-                "Tenancy": safe_get(inst, "Placement", "Tenancy"),
-                "PlacementGroup": safe_get(inst, "Placement", "GroupName"),
-                "PrivateIpAddress": inst.get("PrivateIpAddress"),
-                "PrivateDnsName": inst.get("PrivateDnsName"),
-                "PublicIpAddress": inst.get("PublicIpAddress"),
-                "PublicDnsName": inst.get("PublicDnsName"),
-                "VpcId": inst.get("VpcId"),
-                "SubnetId": inst.get("SubnetId"),
-                "IamInstanceProfileArn": safe_get(inst, "IamInstanceProfile", "Arn"),
-                "RootDeviceName": root_dev_name,
-                "RootDeviceType": root_dev_type,
-                "EbsOptimized": inst.get("EbsOptimized"),
-                "LaunchTime": iso_or_none(launch_time),
-                "UptimeDays": days_between(launch_time),
-                "SecurityGroupIds": ", ".join(sg_ids) if sg_ids else None,
-                "SecurityGroupNames": ", ".join(sg_names) if sg_names else None,
-                "BlockDeviceCount": len(block_map),
-                "Volumes": vol_summary,
-                "ENIs": eni_summary,
-            }
+# ---------- Main ----------
 
-            # Add flattened tags as columns
-            row.update(flatten_tags(inst.get("Tags", [])))
-            rows.append(row)
+def parse_args():
+    parser = argparse.ArgumentParser(description="EC2 inventory across all enabled regions")
+    parser.add_argument("--output-dir", default=".", help="Directory for the CSV, XLSX and AMI cache (default: current directory)")
+    parser.add_argument("--ami-cache", help=f"AMI name cache file (default: <output-dir>/{AMI_CACHE_FILE})")
+    return parser.parse_args()
 
-    # Build DataFrame and save
-    df = pd.DataFrame(rows)
+def main():
+    global _ami_cache_path
+    args = parse_args()
+    os.makedirs(args.output_dir, exist_ok=True)
+    _ami_cache_path = args.ami_cache or os.path.join(args.output_dir, AMI_CACHE_FILE)
 
-    # Sort columns: core first, tags later
-    core_cols = [
-        "AccountId","Region","InstanceId","Name","State","Platform","Architecture","Hypervisor",
-        "ImageId","ImageName","InstanceType","CPU_Cores","CPU_ThreadsPerCore",
-        "AvailabilityZone","Tenancy","PlacementGroup",
-        "PrivateIpAddress","PrivateDnsName","PublicIpAddress","PublicDnsName",
-        "VpcId","SubnetId","IamInstanceProfileArn",
-        "RootDeviceName","RootDeviceType","EbsOptimized",
-        "LaunchTime","UptimeDays",
-        "SecurityGroupIds","SecurityGroupNames","BlockDeviceCount","Volumes","ENIs"
-    ]
-    tag_cols = [c for c in df.columns if c.startswith("tag_")]
-    other_cols = [c for c in df.columns if c not in core_cols + tag_cols]
-    df = df[core_cols + other_cols + tag_cols]
-
-    df.sort_values(["Region","Name","InstanceId"], inplace=True, na_position="last")
-
-    csv_path = "ec2_inventory.csv"
-    xlsx_path = "ec2_inventory.xlsx"
-
-    df.to_csv(csv_path, index=False)
-
-    with pd.ExcelWriter(xlsx_path, engine="xlsxwriter") as writer:
-        df.to_excel(writer, index=False, sheet_name="EC2")
-        # Optional: turn range into an Excel table for nicer filtering
-        wb  = writer.book
-        ws  = writer.sheets["EC2"]
-        rows_count, cols_count = df.shape
-        ws.add_table(0, 0, rows_count, cols_count-1, {
-            "name": "EC2Inventory",
-            "columns": [{"header": col} for col in df.columns],
-            "style": {"theme":"Table Style Medium 9"}
+    session = boto3.Session()
+    account_id = get_account_id()
+    regions = enabled_regions()
+
+    csv_path = os.path.join(args.output_dir, "ec2_inventory.csv")
+    xlsx_path = os.path.join(args.output_dir, "ec2_inventory.xlsx")
+
+    with tempfile.TemporaryDirectory() as spool_dir:
+        # Each finished region is turned into a sorted frame and spooled to
+        # disk as soon as it is consumed; its rows are then released, so only
+        # regions not yet spooled stay in memory.
+        spooled = {}
+        # Each frame is converted to Arrow once and the table spooled beside
+        # it. One region that will not convert sends the whole CSV through
+        # pandas, since the two writers' output differs (quoting, booleans,
+        # timestamps).
+        arrow_spooled = {}
+        use_arrow = pa is not None
+        extra_cols = set()
+        widths = {}
+        total = 0
+
+        # Regions are independent and the scan is I/O-bound, so fan them out;
+        # each worker builds its own regional client and paginators.
+        with ThreadPoolExecutor(max_workers=min(32, len(regions))) as ex:
+            futures = {ex.submit(scan_region, session, r, account_id): r for r in regions}
+            for f in as_completed(futures):
+                # Drop the future too: it would otherwise keep the raw rows alive
+                region = futures.pop(f)
+                rows = f.result()
+                del f
+                if not rows:
+                    continue
+                df = region_frame(rows)
+                spooled[region] = os.path.join(spool_dir, f"{region}.pkl")
+                df.to_pickle(spooled[region])
+                table = arrow_table(df) if use_arrow else None
+                if table is None:
+                    use_arrow = False
+                else:
+                    arrow_spooled[region] = os.path.join(spool_dir, f"{region}.arrow")
+                    pa_feather.write_feather(table, arrow_spooled[region], compression="uncompressed")
+                    del table
+                extra_cols.update(c for c in df.columns if c not in CORE_COLS)
+                for col, w in column_widths(df).items():
+                    widths[col] = max(w, widths.get(col, 0))
+                total += len(df)
+
+        # Sort columns: core first, tags later
+        tag_cols = sorted(c for c in extra_cols if c.startswith("tag_"))
+        other_cols = sorted(c for c in extra_cols if not c.startswith("tag_"))
+        columns = CORE_COLS + other_cols + tag_cols
+
+        # constant_memory flushes each row to disk as it is written; tables are
+        # not available in that mode, so use a header row with an autofilter
+        wb = xlsxwriter.Workbook(xlsx_path, {
+            "constant_memory": True,
+            "default_date_format": "yyyy-mm-dd hh:mm:ss",
         })
+        ws = wb.add_worksheet("EC2")
+        ws.write_row(0, 0, columns, wb.add_format({"bold": True}))
+        ws.autofilter(0, 0, total, len(columns)-1)
         ws.freeze_panes(1, 0)
-        # Auto-fit columns (approx)
-        for i, col in enumerate(df.columns):
-            maxw = max(10, min(60, int(df[col].astype(str).map(len).max() if not df.empty else 10) + 2))
-            ws.set_column(i, i, maxw)
-
-    print(f"✅ Wrote {csv_path} and {xlsx_path} with {len(df)} instances.")
+        for i, col in enumerate(columns):
+            ws.set_column(i, i, widths.get(col, 10))
+
+        row_idx = 1
+        with open(csv_path, "wb") as csv_file:
+            for region in sorted(spooled):
+                df = pd.read_pickle(spooled[region]).reindex(columns=columns)
+                if use_arrow:
+                    table = pa_feather.read_table(arrow_spooled[region], memory_map=True)
+                    write_arrow_csv(table, columns, csv_file, header=row_idx == 1)
+                else:
+                    df.to_csv(csv_file, index=False, header=row_idx == 1)
+                for values in excel_rows(df):
+                    ws.write_row(row_idx, 0, values)
+                    row_idx += 1
+        wb.close()
+
+    print(f"✅ Wrote {csv_path} and {xlsx_path} with {total} instances.")
 
 if __name__ == "__main__":
     main()
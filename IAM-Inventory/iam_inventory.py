@@ -12,17 +12,50 @@ python3 iam_inventory.py
 import boto3
 import pandas as pd
 import json
+import csv
+import io
+import threading
+import time
+from botocore.exceptions import ClientError
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+
+# Keep-alive connections and adaptive retries (absorbs IAM throttling)
+BOTO_CONFIG = Config(
+    tcp_keepalive=True,
+    retries={"max_attempts": 10, "mode": "adaptive"},
+    max_pool_connections=50,
+    connect_timeout=5,
+    read_timeout=30,
+)
+PAGE_SIZE = 1000  # IAM list/get calls accept up to 1000 items per page
+MAX_WORKERS = 16  # Threads for per-user access key calls
+REPORT_POLL_INTERVAL = 2  # seconds between credential report generation checks
+REPORT_POLL_ATTEMPTS = 30
 
 session = boto3.Session()
-iam = session.client("iam")
-sts = session.client("sts")
 
-# Get account ID
-account_id = sts.get_caller_identity()["Account"]
+_local = threading.local()
+_client_lock = threading.Lock()
+
+def get_iam_client():
+    # One IAM client per worker thread; session.client() itself is not thread-safe
+    client = getattr(_local, "iam", None)
+    if client is None:
+        with _client_lock:
+            client = session.client("iam", config=BOTO_CONFIG)
+        _local.iam = client
+    return client
+
+@lru_cache(maxsize=1)
+def get_account_id():
+    return session.client("sts", config=BOTO_CONFIG).get_caller_identity()["Account"]
 
 # ========== Account Info ==========
 def get_account_summary():
+    iam = get_iam_client()
     summary = iam.get_account_summary()["SummaryMap"]
     try:
         policy = iam.get_account_password_policy()["PasswordPolicy"]
@@ -30,7 +63,7 @@ def get_account_summary():
         policy = {}
 
     return {
-        "AccountId": account_id,
+        "AccountId": get_account_id(),
         "RootMFAEnabled": summary.get("AccountMFAEnabled"),
         "Users": summary.get("Users", 0),
         "Groups": summary.get("Groups", 0),
@@ -39,101 +72,131 @@ def get_account_summary():
         "PasswordPolicy": json.dumps(policy)
     }
 
+# ========== Authorization Details ==========
+def fetch_all_iam():
+    # One paginated call returns users, groups and roles with their group
+    # memberships, attached/inline policies and assume-role documents
+    details = {"UserDetailList": [], "GroupDetailList": [], "RoleDetailList": []}
+    paginator = get_iam_client().get_paginator("get_account_authorization_details")
+
+    for page in paginator.paginate(Filter=["User", "Group", "Role"], PaginationConfig={"PageSize": PAGE_SIZE}):
+        for key, items in details.items():
+            items.extend(page.get(key, []))
+    return details
+
+# ========== Credential Report ==========
+def get_credential_report():
+    # One CSV row per user with last-used data for both access key slots;
+    # {} when the report is unavailable, so keys fall back to per-key lookups
+    client = get_iam_client()
+    try:
+        for _ in range(REPORT_POLL_ATTEMPTS):
+            if client.generate_credential_report()["State"] == "COMPLETE":
+                break
+            time.sleep(REPORT_POLL_INTERVAL)
+        content = client.get_credential_report()["Content"].decode("utf-8")
+    except ClientError as e:
+        # e.g. AccessDenied, or the report still not ready after polling
+        print(f"⚠️ Credential report unavailable, looking up each access key instead: {e}")
+        return {}
+    return {row["user"]: row for row in csv.DictReader(io.StringIO(content))}
+
+def parse_report_date(value):
+    if not value or value in ("N/A", "not_supported"):
+        return None
+    return datetime.fromisoformat(value)
+
+def key_last_used(report_row, create_date):
+    # The report has no key IDs; a key's slot is the one rotated when it was created
+    for slot in (1, 2):
+        rotated = parse_report_date(report_row.get(f"access_key_{slot}_last_rotated"))
+        if rotated and rotated == create_date.replace(microsecond=0):
+            return {
+                "LastUsedDate": parse_report_date(report_row.get(f"access_key_{slot}_last_used_date")),
+                "Region": report_row.get(f"access_key_{slot}_last_used_region"),
+                "ServiceName": report_row.get(f"access_key_{slot}_last_used_service"),
+            }
+    return None
+
 # ========== Users ==========
-def list_users():
+def fetch_user_access_keys(username, report_row):
+    client = get_iam_client()
+    access_keys_data = []
+
+    keys = client.list_access_keys(UserName=username)["AccessKeyMetadata"]
+    for k in keys:
+        last_used = key_last_used(report_row, k["CreateDate"])
+        if last_used is None:
+            last_used = client.get_access_key_last_used(AccessKeyId=k["AccessKeyId"])["AccessKeyLastUsed"]
+        access_keys_data.append({
+            "UserName": username,
+            "AccessKeyId": k["AccessKeyId"],
+            "Status": k["Status"],
+            "CreateDate": k["CreateDate"],
+            "LastUsedDate": last_used.get("LastUsedDate"),
+            "LastUsedRegion": last_used.get("Region"),
+            "LastUsedService": last_used.get("ServiceName")
+        })
+    return access_keys_data
+
+def list_users(auth_details, credential_report):
     users_data, access_keys_data = [], []
-    paginator = iam.get_paginator("list_users")
-
-    for page in paginator.paginate():
-        for user in page["Users"]:
-            username = user["UserName"]
-
-            # Groups
-            groups = [g["GroupName"] for g in iam.list_groups_for_user(UserName=username)["Groups"]]
-
-            # Managed policies
-            mpols = [p["PolicyName"] for p in iam.list_attached_user_policies(UserName=username)["AttachedPolicies"]]
-
-            # Inline policies
-            ipols = iam.list_user_policies(UserName=username)["PolicyNames"]
-
-            # Access keys
-            keys = iam.list_access_keys(UserName=username)["AccessKeyMetadata"]
-            for k in keys:
-                last_used = iam.get_access_key_last_used(AccessKeyId=k["AccessKeyId"])["AccessKeyLastUsed"]
-                access_keys_data.append({
-                    "UserName": username,
-                    "AccessKeyId": k["AccessKeyId"],
-                    "Status": k["Status"],
-                    "CreateDate": k["CreateDate"],
-                    "LastUsedDate": last_used.get("LastUsedDate"),
-                    "LastUsedRegion": last_used.get("Region"),
-                    "LastUsedService": last_used.get("ServiceName")
-                })
-
-            users_data.append({
-                "UserName": username,
-                "Arn": user["Arn"],
-                "CreateDate": user["CreateDate"],
-                "Groups": groups,
-                "ManagedPolicies": mpols,
-                "InlinePolicies": ipols
-            })
+    user_details = auth_details["UserDetailList"]
+
+    for user in user_details:
+        users_data.append({
+            "UserName": user["UserName"],
+            "Arn": user["Arn"],
+            "CreateDate": user["CreateDate"],
+            "Groups": user.get("GroupList", []),
+            "ManagedPolicies": [p["PolicyName"] for p in user.get("AttachedManagedPolicies", [])],
+            "InlinePolicies": [p["PolicyName"] for p in user.get("UserPolicyList", [])]
+        })
+
+    # Access keys are not part of the authorization details
+    usernames = [u["UserName"] for u in user_details]
+    report_rows = [credential_report.get(name, {}) for name in usernames]
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        for keys in ex.map(fetch_user_access_keys, usernames, report_rows):
+            access_keys_data.extend(keys)
 
     return users_data, access_keys_data
 
 # ========== Groups ==========
-def list_groups():
+def list_groups(auth_details):
     groups_data = []
-    paginator = iam.get_paginator("list_groups")
-
-    for page in paginator.paginate():
-        for g in page["Groups"]:
-            gp = g["GroupName"]
 
-            # Managed policies
-            mpols = [p["PolicyName"] for p in iam.list_attached_group_policies(GroupName=gp)["AttachedPolicies"]]
-
-            # Inline
-            ipols = iam.list_group_policies(GroupName=gp)["PolicyNames"]
-
-            groups_data.append({
-                "GroupName": gp,
-                "Arn": g["Arn"],
-                "CreateDate": g["CreateDate"],
-                "ManagedPolicies": mpols,
-                "InlinePolicies": ipols
-            })
+    for g in auth_details["GroupDetailList"]:
+        groups_data.append({
+            "GroupName": g["GroupName"],
+            "Arn": g["Arn"],
+            "CreateDate": g["CreateDate"],
+            "ManagedPolicies": [p["PolicyName"] for p in g.get("AttachedManagedPolicies", [])],
+            "InlinePolicies": [p["PolicyName"] for p in g.get("GroupPolicyList", [])]
+        })
     return groups_data
 
 # ========== Roles ==========
-def list_roles():
+def list_roles(auth_details):
     roles_data = []
-    paginator = iam.get_paginator("list_roles")
-
-    for page in paginator.paginate():
-        for r in page["Roles"]:
-            rname = r["RoleName"]
-
-            mpols = [p["PolicyName"] for p in iam.list_attached_role_policies(RoleName=rname)["AttachedPolicies"]]
-            ipols = iam.list_role_policies(RoleName=rname)["PolicyNames"]
-
-            roles_data.append({
-                "RoleName": rname,
-                "Arn": r["Arn"],
-                "CreateDate": r["CreateDate"],
-                "AssumeRolePolicy": json.dumps(r["AssumeRolePolicyDocument"]),
-                "ManagedPolicies": mpols,
-                "InlinePolicies": ipols
-            })
+
+    for r in auth_details["RoleDetailList"]:
+        roles_data.append({
+            "RoleName": r["RoleName"],
+            "Arn": r["Arn"],
+            "CreateDate": r["CreateDate"],
+            "AssumeRolePolicy": json.dumps(r["AssumeRolePolicyDocument"]),
+            "ManagedPolicies": [p["PolicyName"] for p in r.get("AttachedManagedPolicies", [])],
+            "InlinePolicies": [p["PolicyName"] for p in r.get("RolePolicyList", [])]
+        })
     return roles_data
 
 # ========== Policies ==========
 def list_policies():
     policies_data = []
-    paginator = iam.get_paginator("list_policies")
+    paginator = get_iam_client().get_paginator("list_policies")
 
-    for page in paginator.paginate(Scope="All", OnlyAttached=False):
+    for page in paginator.paginate(Scope="All", OnlyAttached=False, PaginationConfig={"PageSize": PAGE_SIZE}):
         for p in page["Policies"]:
             policies_data.append({
                 "PolicyName": p["PolicyName"],
@@ -151,9 +214,10 @@ def main():
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
     account_summary = [get_account_summary()]
-    users, keys = list_users()
-    groups = list_groups()
-    roles = list_roles()
+    auth_details = fetch_all_iam()
+    users, keys = list_users(auth_details, get_credential_report())
+    groups = list_groups(auth_details)
+    roles = list_roles(auth_details)
     policies = list_policies()
 
     # Save to Excel
@@ -5,141 +5,182 @@ iam_users_inventory.py
 Inventory all IAM users with rich user-level details.
 python3 --version
 aws configure
-pip install boto3 pandas openpyxl
+pip install boto3 pandas pyarrow openpyxl
 python3 iam_users_inventory.py
 
 Outputs:
   - iam_users_<timestamp>.csv
-  - iam_users_<timestamp>.xlsx  (sheet: Users, sheet: AccessKeys)
+  - iam_users_<timestamp>.parquet, iam_access_keys_<timestamp>.parquet  (zstd)
+  - iam_users_<timestamp>.jsonl  (full per-user details, one JSON object per line)
+  - iam_users_<timestamp>.xlsx  (only with --xlsx; sheet: Users, sheet: AccessKeys)
 
 Usage:
-  python iam_users_inventory.py
+  python iam_users_inventory.py [--xlsx]
 """
 
+import argparse
 import boto3
 import botocore
 import pandas as pd
-from datetime import datetime
+import openpyxl
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from datetime import datetime, timezone
 from collections import defaultdict
 import json
+import random
+import time
+
+try:
+    import orjson
+except ImportError:  # optional: faster JSON encoder
+    orjson = None
 
 TIMESTAMP = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
 CSV_PATH = f"iam_users_{TIMESTAMP}.csv"
 XLSX_PATH = f"iam_users_{TIMESTAMP}.xlsx"
+PARQUET_PATH = f"iam_users_{TIMESTAMP}.parquet"
+ACCESS_KEYS_PARQUET_PATH = f"iam_access_keys_{TIMESTAMP}.parquet"
+DETAILS_JSONL_PATH = f"iam_users_{TIMESTAMP}.jsonl"
+CSV_BUFFER_SIZE = 4 * 1024 * 1024  # Fewer, larger write syscalls
+
+# Pool sized above the worker count; adaptive retries absorb IAM throttling
+BOTO_CONFIG = Config(
+    max_pool_connections=32,
+    retries={"max_attempts": 15, "mode": "adaptive"},
+)
+# Error codes that mean "slow down" rather than a real failure
+THROTTLE_CODES = {"Throttling", "ThrottlingException", "RequestLimitExceeded", "SlowDown", "TooManyRequestsException"}
+THROTTLE_RETRIES = 5  # Extra attempts in safe_call once botocore's own retries are exhausted
+THROTTLE_BACKOFF_CAP = 20  # Seconds
+MAX_WORKERS = 16  # Threads for per-user access key / MFA / SSH key calls
+PAGE_SIZE = 1000  # IAM list/get calls accept up to 1000 items per page
+# Users sheet/CSV columns (before tag_*), fixed so an account with no users still gets a header
+USER_COLUMNS = [
+    "UserName", "UserId", "Arn", "Path", "CreateDate", "PasswordLastUsed",
+    "Groups", "ManagedPolicies", "InlinePolicies",
+    "AccessKeyCount", "MFADevicesCount", "SSHPublicKeysCount",
+]
 
 session = boto3.Session()
-iam = session.client("iam")
-sts = session.client("sts")
+iam = session.client("iam", config=BOTO_CONFIG)
+sts = session.client("sts", config=BOTO_CONFIG)
+
+def throttle_backoff(attempt):
+    # Exponential backoff with full jitter
+    time.sleep(random.uniform(0, min(THROTTLE_BACKOFF_CAP, 2 ** attempt)))
 
 def safe_call(fn, *args, **kwargs):
-    try:
-        return fn(*args, **kwargs)
-    except botocore.exceptions.ClientError as e:
-        return {"_error": e.response.get("Error", {}).get("Message", str(e))}
-    except Exception as e:
-        return {"_error": str(e)}
+    # Throttling is retried with backoff so it never masquerades as "no data"
+    for attempt in range(THROTTLE_RETRIES + 1):
+        try:
+            return fn(*args, **kwargs)
+        except botocore.exceptions.ClientError as e:
+            err = e.response.get("Error", {})
+            if err.get("Code") in THROTTLE_CODES and attempt < THROTTLE_RETRIES:
+                throttle_backoff(attempt)
+                continue
+            return {"_error": err.get("Message", str(e))}
+        except Exception as e:
+            return {"_error": str(e)}
+
+def dumps(obj):
+    # JSON bytes: orjson (Rust, datetime-aware) when installed, stdlib otherwise.
+    # default=str only catches the odd non-JSON type; datetimes never reach it.
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NAIVE_UTC)
+    return json.dumps(obj, default=str).encode("utf-8")
+
+def excel_value(v):
+    # openpyxl cells take scalars only: drop tz info, serialise nested objects
+    if isinstance(v, (dict, list)):
+        return dumps(v).decode("utf-8")
+    if isinstance(v, datetime) and v.tzinfo is not None:
+        return v.astimezone(timezone.utc).replace(tzinfo=None)
+    return v
+
+def write_sheet(wb, title, df):
+    # Stream a DataFrame into a write-only worksheet, missing cells as None
+    ws = wb.create_sheet(title)
+    ws.append(list(df.columns))
+    for row in df.astype(object).where(df.notna(), None).itertuples(index=False, name=None):
+        ws.append([excel_value(v) for v in row])
+
+@lru_cache(maxsize=1)
+def get_account_id():
+    return sts.get_caller_identity()["Account"]
 
 def list_all_users():
     users = []
     paginator = iam.get_paginator("list_users")
-    for page in paginator.paginate():
+    for page in paginator.paginate(PaginationConfig={"PageSize": PAGE_SIZE}):
         users.extend(page.get("Users", []))
     return users
 
-def list_groups_for_user(username):
-    resp = safe_call(iam.list_groups_for_user, UserName=username)
-    if isinstance(resp, dict) and resp.get("_error"):
-        return []
-    return [g.get("GroupName") for g in resp.get("Groups", [])]
+def list_user_authorization_details():
+    # One paginated call returns group memberships, attached + inline policies
+    # (with documents) and tags for every user; indexed by UserName
+    details = {}
+    paginator = iam.get_paginator("get_account_authorization_details")
+    for page in paginator.paginate(Filter=["User"], PaginationConfig={"PageSize": PAGE_SIZE}):
+        for u in page.get("UserDetailList", []):
+            details[u["UserName"]] = u
+    return details
 
-def list_attached_user_policies(username):
-    out = []
-    paginator = iam.get_paginator("list_attached_user_policies")
-    try:
-        for page in paginator.paginate(UserName=username):
-            for p in page.get("AttachedPolicies", []):
-                out.append({"PolicyName": p.get("PolicyName"), "PolicyArn": p.get("PolicyArn")})
-    except botocore.exceptions.ClientError:
-        pass
-    return out
-
-def list_inline_user_policies(username):
-    out = []
-    paginator = iam.get_paginator("list_user_policies")
-    try:
-        for page in paginator.paginate(UserName=username):
-            for pname in page.get("PolicyNames", []):
-                # fetch the inline policy document (URL-encoded JSON)
-                try:
-                    pol = iam.get_user_policy(UserName=username, PolicyName=pname)
-                    # PolicyDocument is a dict (may contain AWS-specific URL-encoded chars)
-                    out.append({"PolicyName": pname, "PolicyDocument": pol.get("PolicyDocument")})
-                except botocore.exceptions.ClientError:
-                    out.append({"PolicyName": pname, "PolicyDocument": None})
-    except botocore.exceptions.ClientError:
-        pass
-    return out
+def safe_list(fn, username, what):
+    # Full listing, or None if it failed; throttling is retried by safe_call,
+    # so an empty list always means "none" rather than "could not tell"
+    result = safe_call(fn, username)
+    if isinstance(result, dict) and "_error" in result:
+        print(f"⚠️ Could not list {what} for {username}: {result['_error']}")
+        return None
+    return result
 
 def list_access_keys(username):
     keys = []
     paginator = iam.get_paginator("list_access_keys")
-    try:
-        for page in paginator.paginate(UserName=username):
-            for k in page.get("AccessKeyMetadata", []):
-                key_id = k.get("AccessKeyId")
-                create_date = k.get("CreateDate")
-                status = k.get("Status")
-                # Last used info (best-effort)
-                last_used = safe_call(iam.get_access_key_last_used, AccessKeyId=key_id)
-                if isinstance(last_used, dict) and last_used.get("_error"):
-                    lu = None
-                else:
-                    lu = last_used.get("AccessKeyLastUsed")
-                keys.append({
-                    "UserName": username,
-                    "AccessKeyId": key_id,
-                    "Status": status,
-                    "CreateDate": create_date,
-                    "LastUsed": lu
-                })
-    except botocore.exceptions.ClientError:
-        pass
+    for page in paginator.paginate(UserName=username, PaginationConfig={"PageSize": PAGE_SIZE}):
+        for k in page.get("AccessKeyMetadata", []):
+            key_id = k.get("AccessKeyId")
+            create_date = k.get("CreateDate")
+            status = k.get("Status")
+            # Last used info (best-effort)
+            last_used = safe_call(iam.get_access_key_last_used, AccessKeyId=key_id)
+            if isinstance(last_used, dict) and last_used.get("_error"):
+                lu = None
+            else:
+                lu = last_used.get("AccessKeyLastUsed")
+            keys.append({
+                "UserName": username,
+                "AccessKeyId": key_id,
+                "Status": status,
+                "CreateDate": create_date,
+                "LastUsed": lu
+            })
     return keys
 
 def list_mfa_devices(username):
     out = []
-    try:
-        resp = iam.list_mfa_devices(UserName=username)
-        for m in resp.get("MFADevices", []):
-            out.append({"SerialNumber": m.get("SerialNumber"), "EnableDate": m.get("EnableDate")})
-    except botocore.exceptions.ClientError:
-        pass
+    resp = iam.list_mfa_devices(UserName=username)
+    for m in resp.get("MFADevices", []):
+        out.append({"SerialNumber": m.get("SerialNumber"), "EnableDate": m.get("EnableDate")})
     return out
 
 def list_ssh_public_keys(username):
     out = []
     paginator = iam.get_paginator("list_ssh_public_keys")
-    try:
-        for page in paginator.paginate(UserName=username):
-            for s in page.get("SSHPublicKeys", []):
-                out.append({
-                    "UserName": username,
-                    "SSHPublicKeyId": s.get("SSHPublicKeyId"),
-                    "Status": s.get("Status"),
-                    "UploadDate": s.get("UploadDate")
-                })
-    except botocore.exceptions.ClientError:
-        pass
+    for page in paginator.paginate(UserName=username, PaginationConfig={"PageSize": PAGE_SIZE}):
+        for s in page.get("SSHPublicKeys", []):
+            out.append({
+                "UserName": username,
+                "SSHPublicKeyId": s.get("SSHPublicKeyId"),
+                "Status": s.get("Status"),
+                "UploadDate": s.get("UploadDate")
+            })
     return out
 
-def list_user_tags(username):
-    try:
-        resp = iam.list_user_tags(UserName=username)
-        return {t["Key"]: t["Value"] for t in resp.get("Tags", [])}
-    except botocore.exceptions.ClientError:
-        return {}
-
-def gather_user_record(user):
+def gather_user_record(user, auth_detail):
     username = user.get("UserName")
     user_id = user.get("UserId")
     arn = user.get("Arn")
@@ -147,19 +188,23 @@ def gather_user_record(user):
     create_date = user.get("CreateDate")
     password_last_used = user.get("PasswordLastUsed")  # may be absent
     # Groups
-    groups = list_groups_for_user(username)
+    groups = auth_detail.get("GroupList", [])
     # Managed policies
-    managed_policies = list_attached_user_policies(username)
-    # Inline policies
-    inline_policies = list_inline_user_policies(username)
-    # Access keys
-    access_keys = list_access_keys(username)
-    # MFA
-    mfa = list_mfa_devices(username)
-    # SSH public keys
-    ssh_keys = list_ssh_public_keys(username)
+    managed_policies = [
+        {"PolicyName": p.get("PolicyName"), "PolicyArn": p.get("PolicyArn")}
+        for p in auth_detail.get("AttachedManagedPolicies", [])
+    ]
+    # Inline policies (documents are already decoded)
+    inline_policies = [
+        {"PolicyName": p.get("PolicyName"), "PolicyDocument": p.get("PolicyDocument")}
+        for p in auth_detail.get("UserPolicyList", [])
+    ]
+    # Access keys, MFA, SSH public keys (None = lookup failed, count left blank)
+    access_keys = safe_list(list_access_keys, username, "access keys")
+    mfa = safe_list(list_mfa_devices, username, "MFA devices")
+    ssh_keys = safe_list(list_ssh_public_keys, username, "SSH public keys")
     # Tags
-    tags = list_user_tags(username)
+    tags = {t["Key"]: t["Value"] for t in auth_detail.get("Tags", [])}
 
     # Build a flattened user dict for tabular output
     user_row = {
@@ -172,15 +217,11 @@ def gather_user_record(user):
         "Groups": ", ".join(groups) if groups else None,
         "ManagedPolicies": ", ".join([p["PolicyName"] for p in managed_policies]) if managed_policies else None,
         "InlinePolicies": ", ".join([p["PolicyName"] for p in inline_policies]) if inline_policies else None,
-        "AccessKeyCount": len(access_keys),
-        "MFADevicesCount": len(mfa),
-        "SSHPublicKeysCount": len(ssh_keys),
+        "AccessKeyCount": len(access_keys) if access_keys is not None else None,
+        "MFADevicesCount": len(mfa) if mfa is not None else None,
+        "SSHPublicKeysCount": len(ssh_keys) if ssh_keys is not None else None,
     }
 
-    # Add tags as tag_<Key> columns
-    for k, v in tags.items():
-        user_row[f"tag_{k}"] = v
-
     # Also keep the full objects (for JSON or detailed sheets)
     details = {
         "ManagedPolicies": managed_policies,
@@ -193,24 +234,35 @@ def gather_user_record(user):
 
     return user_row, details
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="IAM users inventory")
+    parser.add_argument('--xlsx', action='store_true', help='Also write the Excel workbook (slow for large accounts)')
+    return parser.parse_args()
+
 def main():
-    caller = sts.get_caller_identity()
-    account = caller.get("Account")
+    args = parse_args()
+    account = get_account_id()
     print(f"Running IAM inventory for account: {account}")
 
     users = list_all_users()
     print(f"Discovered {len(users)} IAM users")
+    auth_details = list_user_authorization_details()
 
     rows = []
+    tags_list = []
     access_key_rows = []
     detailed_map = {}
 
-    for u in users:
-        user_row, details = gather_user_record(u)
+    user_details = [auth_details.get(u["UserName"], {}) for u in users]
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        records = list(ex.map(gather_user_record, users, user_details))
+
+    for user_row, details in records:
         rows.append(user_row)
+        tags_list.append(details["Tags"])
 
         # Collect per-access-key row for separate sheet
-        for ak in details.get("AccessKeys", []):
+        for ak in details.get("AccessKeys") or []:
             access_key_rows.append({
                 "UserName": ak.get("UserName"),
                 "AccessKeyId": ak.get("AccessKeyId"),
@@ -224,26 +276,41 @@ def main():
         # Save full JSON details to a dict keyed by username
         detailed_map[user_row["UserName"]] = details
 
-    df_users = pd.DataFrame(rows)
+    # Tags become tag_<Key> columns in one vectorised pass
+    df_tags = pd.json_normalize(tags_list, max_level=0).add_prefix("tag_")
+    df_users = pd.concat([pd.DataFrame(rows, columns=USER_COLUMNS), df_tags], axis=1)
+    # Nullable ints: a failed lookup stays blank instead of turning counts into floats
+    count_cols = ["AccessKeyCount", "MFADevicesCount", "SSHPublicKeysCount"]
+    df_users[count_cols] = df_users[count_cols].astype("Int64")
     df_access = pd.DataFrame(access_key_rows)
+    if not df_access.empty:
+        df_access["Status"] = df_access["Status"].astype("category")
 
-    # Save CSV and Excel
-    df_users.to_csv(CSV_PATH, index=False)
+    # Save CSV and Parquet (compact, typed, fast to reload)
+    with open(CSV_PATH, "wb", buffering=CSV_BUFFER_SIZE) as f:
+        df_users.to_csv(f, index=False)
+    written = [CSV_PATH, PARQUET_PATH]
+    df_users.to_parquet(PARQUET_PATH, compression="zstd", engine="pyarrow", index=False)
+    if not df_access.empty:
+        df_access.to_parquet(ACCESS_KEYS_PARQUET_PATH, compression="zstd", engine="pyarrow", index=False)
+        written.append(ACCESS_KEYS_PARQUET_PATH)
 
-    with pd.ExcelWriter(XLSX_PATH, engine="openpyxl") as writer:
-        df_users.to_excel(writer, sheet_name="Users", index=False)
-        if not df_access.empty:
-            df_access.to_excel(writer, sheet_name="AccessKeys", index=False)
-        # Optionally add a sheet with full JSON dump of details
-        # Write a JSON column with pretty-printed details (not required)
-        # Build a small df with username + json details
-        detail_rows = []
+    # Full per-user details (policies, keys, MFA, SSH keys, tags) as JSONL
+    with open(DETAILS_JSONL_PATH, "wb", buffering=CSV_BUFFER_SIZE) as f:
         for uname, det in detailed_map.items():
-            detail_rows.append({"UserName": uname, "DetailsJson": json.dumps(det, default=str)})
-        df_det = pd.DataFrame(detail_rows)
-        df_det.to_excel(writer, sheet_name="UserDetailsJson", index=False)
+            f.write(dumps({"UserName": uname, "Details": det}) + b"\n")
+    written.append(DETAILS_JSONL_PATH)
+
+    # Excel is for humans only; opt in with --xlsx
+    if args.xlsx:
+        wb = openpyxl.Workbook(write_only=True)
+        write_sheet(wb, "Users", df_users)
+        if not df_access.empty:
+            write_sheet(wb, "AccessKeys", df_access)
+        wb.save(XLSX_PATH)
+        written.append(XLSX_PATH)
 
-    print(f"✅ Wrote:\n - {CSV_PATH}\n - {XLSX_PATH}")
+    print("✅ Wrote:\n - " + "\n - ".join(written))
     print(f"Users: {len(df_users)}, AccessKeys rows: {len(df_access)}")
 
 if __name__ == "__main__":
@@ -5,37 +5,97 @@ RDS_inventory.py
 Inventory all rds details.
 python3 --version
 aws configure
-pip install boto3 pandas openpyxl
-python3 rds_inventory.py
+pip install boto3 pandas pyarrow openpyxl
+python3 rds_inventory.py [--xlsx]
 
+Outputs rds_inventory_<timestamp>.csv and .parquet (zstd); the .xlsx
+workbook is only written with --xlsx.
 """
 
+import argparse
 import boto3
 import pandas as pd
-from datetime import datetime
+import itertools
+import json
+import openpyxl
+import threading
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+
+parser = argparse.ArgumentParser(description="RDS inventory")
+parser.add_argument('--xlsx', action='store_true', help='Also write the Excel workbook')
+args = parser.parse_args()
+
+# Connection pool + adaptive retries shared by every client
+BOTO_CONFIG = Config(
+    max_pool_connections=64,
+    retries={"max_attempts": 15, "mode": "adaptive"},
+)
 
 session = boto3.Session(region_name="us-east-1")  # Change default region if needed
-rds = session.client("rds")
-sts = session.client("sts")
+sts = session.client("sts", config=BOTO_CONFIG)
+_client_lock = threading.Lock()  # session.client() is not thread-safe
+CSV_BUFFER_SIZE = 4 * 1024 * 1024  # Fewer, larger write syscalls
+PAGE_SIZE = 100  # DescribeDBInstances caps MaxRecords at 100
+# Low-cardinality columns stored as pandas categoricals (dictionary-encoded in Parquet)
+CATEGORY_COLS = ["Region", "Engine", "EngineVersion", "Status", "InstanceClass", "StorageType", "AvailabilityZone"]
+
+@lru_cache(maxsize=1)
+def get_account_id():
+    return sts.get_caller_identity()["Account"]
+
+@lru_cache(maxsize=None)
+def enabled_regions(service="rds"):
+    # Regions enabled for the account where the service has an endpoint;
+    # get_available_regions() reads botocore's bundled endpoint data (no API call)
+    supported = set(session.get_available_regions(service))
+    ec2 = session.client("ec2", config=BOTO_CONFIG)
+    return [r["RegionName"] for r in ec2.describe_regions(AllRegions=False)["Regions"]
+            if r["RegionName"] in supported]
 
 # Get account ID
-account_id = sts.get_caller_identity()["Account"]
-
-all_data = []
+account_id = get_account_id()
 
 # Get all regions where RDS is available
-ec2 = session.client("ec2")
-regions = [r["RegionName"] for r in ec2.describe_regions()["Regions"]]
-
-for region in regions:
+regions = enabled_regions("rds")
+
+def excel_value(v):
+    # openpyxl cells take scalars only: drop tz info, serialise nested objects
+    if isinstance(v, (dict, list)):
+        return json.dumps(v, default=str)
+    if isinstance(v, datetime) and v.tzinfo is not None:
+        return v.astimezone(timezone.utc).replace(tzinfo=None)
+    return v
+
+def write_sheet(wb, title, df):
+    # Stream a DataFrame into a write-only worksheet, missing cells as None
+    ws = wb.create_sheet(title)
+    ws.append(list(df.columns))
+    for row in df.astype(object).where(df.notna(), None).itertuples(index=False, name=None):
+        ws.append([excel_value(v) for v in row])
+
+@lru_cache(maxsize=None)
+def rds_client(region):
+    # Built once per region (model loading is slow) and reused afterwards
+    with _client_lock:
+        return session.client("rds", region_name=region, config=BOTO_CONFIG)
+
+def scan_region(region):
+    # Returns a list of row dicts for one region; runs in a worker thread
     print(f"🔍 Scanning region: {region}")
-    rds_regional = boto3.client("rds", region_name=region)
+    rds_regional = rds_client(region)
     try:
-        instances = rds_regional.describe_db_instances()["DBInstances"]
+        instances = []
+        paginator = rds_regional.get_paginator("describe_db_instances")
+        for page in paginator.paginate(PaginationConfig={"PageSize": PAGE_SIZE}):
+            instances.extend(page.get("DBInstances", []))
     except Exception as e:
         print(f"Error in {region}: {e}")
-        continue
+        return []
 
+    rows = []
     for db in instances:
         # Basic RDS details
         db_id = db["DBInstanceIdentifier"]
@@ -60,22 +120,19 @@ for region in regions:
             endpoint = db["Endpoint"].get("Address")
             port = db["Endpoint"].get("Port")
 
-        # Security Groups
-        sg_ids = []
-        sg_names = []
-        for vpcsg in db.get("VpcSecurityGroups", []):
-            sg_ids.append(vpcsg.get("VpcSecurityGroupId"))
-            sg_names.append(vpcsg.get("Status"))
+        # Security Groups (membership status, not names, is what RDS returns)
+        vpc_sgs = db.get("VpcSecurityGroups", [])
+        sg_ids = ",".join(v["VpcSecurityGroupId"] for v in vpc_sgs if v.get("VpcSecurityGroupId"))
+        sg_statuses = ",".join(v["Status"] for v in vpc_sgs if v.get("Status"))
 
         # Backup & Maintenance
         backup_window = db.get("PreferredBackupWindow")
         maint_window = db.get("PreferredMaintenanceWindow")
 
-        # Tags
-        tags_resp = rds_regional.list_tags_for_resource(ResourceName=db["DBInstanceArn"])
-        tags = {t["Key"]: t["Value"] for t in tags_resp.get("TagList", [])}
+        # Tags (returned inline by describe_db_instances, no per-DB call)
+        tags = {t["Key"]: t["Value"] for t in db.get("TagList", [])}
 
-        all_data.append({
+        rows.append({
             "AccountId": account_id,
             "Region": region,
             "DBIdentifier": db_id,
@@ -92,24 +149,45 @@ for region in regions:
             "SubnetGroup": subnet_group,
             "Endpoint": endpoint,
             "Port": port,
-            "SecurityGroupIds": ",".join(filter(None, sg_ids)),
-            "SecurityGroupStatus": ",".join(filter(None, sg_names)),
+            "SecurityGroupIds": sg_ids,
+            "SecurityGroupStatus": sg_statuses,
             "BackupWindow": backup_window,
             "MaintenanceWindow": maint_window,
             "CreatedTime": created,
-            **{f"tag_{k}": v for k, v in tags.items()}  # include tags dynamically
+            "Tags": tags,  # expanded into tag_<Key> columns below
         })
+    return rows
+
+# Regions are independent round trips, so scan them all at once
+with ThreadPoolExecutor(max_workers=len(regions)) as ex:
+    all_data = list(itertools.chain.from_iterable(ex.map(scan_region, regions)))
 
 # Convert to DataFrame
 df = pd.DataFrame(all_data)
+# Tags become tag_<Key> columns in one vectorised pass
+if not df.empty:
+    df_tags = pd.json_normalize(df.pop("Tags").tolist(), max_level=0).add_prefix("tag_")
+    df = pd.concat([df, df_tags], axis=1)
+    df[CATEGORY_COLS] = df[CATEGORY_COLS].astype("category")
 
-# Save to CSV
-csv_file = f"rds_inventory_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-df.to_csv(csv_file, index=False)
-
-# Save to Excel
-excel_file = f"rds_inventory_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-with pd.ExcelWriter(excel_file, engine="openpyxl") as writer:
-    df.to_excel(writer, sheet_name="RDS Inventory", index=False)
+timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
 
-print(f"\n✅ Inventory complete. Files saved:\n - {csv_file}\n - {excel_file}")
+# Save to CSV
+csv_file = f"rds_inventory_{timestamp}.csv"
+with open(csv_file, "wb", buffering=CSV_BUFFER_SIZE) as f:
+    df.to_csv(f, index=False)
+
+# Save to Parquet (compact, typed, fast to reload)
+parquet_file = f"rds_inventory_{timestamp}.parquet"
+df.to_parquet(parquet_file, compression="zstd", engine="pyarrow", index=False)
+saved = [csv_file, parquet_file]
+
+# Save to Excel (opt-in with --xlsx)
+if args.xlsx:
+    excel_file = f"rds_inventory_{timestamp}.xlsx"
+    wb = openpyxl.Workbook(write_only=True)
+    write_sheet(wb, "RDS Inventory", df)
+    wb.save(excel_file)
+    saved.append(excel_file)
+
+print("\n✅ Inventory complete. Files saved:\n - " + "\n - ".join(saved))
@@ -1,66 +1,91 @@
 import boto3
 import csv
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
 
-def check_bucket_security(bucket_name, s3_client):
-    findings = {
-        "Bucket": bucket_name,
-        "PublicAccessBlock": "Unknown",
-        "ACL_Public": False,
-        "Policy_Public": False,
-        "Encryption": "Disabled",
-        "Versioning": "Disabled",
-        "Logging": "Disabled",
-        "Severity": "Low"
-    }
+CSV_BUFFER_SIZE = 1024 * 1024  # Fewer, larger write syscalls
 
-    # Check Public Access Block
+# Adaptive retries rate-limit the client before S3 starts returning SlowDown
+BOTO_CONFIG = Config(retries={"max_attempts": 15, "mode": "adaptive"})
+CHECK_WORKERS = 4  # Per-bucket security checks issued concurrently
+
+def check_policy_status(s3_client, bucket_name):
     try:
-        pab = s3_client.get_bucket_policy_status(Bucket=bucket_name)
-        findings["Policy_Public"] = pab["PolicyStatus"]["IsPublic"]
+        status = s3_client.get_bucket_policy_status(Bucket=bucket_name)
+        return {"Policy_Public": status["PolicyStatus"].get("IsPublic", False)}
     except ClientError:
-        findings["Policy_Public"] = False
+        return {"Policy_Public": False}
 
+def check_public_access_block(s3_client, bucket_name):
     try:
-        pab_config = s3_client.get_bucket_policy_status(Bucket=bucket_name)
-        findings["PublicAccessBlock"] = "Restricted" if not pab_config["PolicyStatus"]["IsPublic"] else "Public"
+        cfg = s3_client.get_public_access_block(Bucket=bucket_name)["PublicAccessBlockConfiguration"]
     except ClientError:
-        findings["PublicAccessBlock"] = "NotConfigured"
+        return {"PublicAccessBlock": "NotConfigured"}
+    flags = [cfg.get(k, False) for k in ("BlockPublicAcls", "IgnorePublicAcls", "BlockPublicPolicy", "RestrictPublicBuckets")]
+    if all(flags):
+        return {"PublicAccessBlock": "Restricted"}
+    return {"PublicAccessBlock": "Partial" if any(flags) else "Public"}
 
-    # Check ACL
+def check_acl(s3_client, bucket_name):
     try:
         acl = s3_client.get_bucket_acl(Bucket=bucket_name)
         for grant in acl["Grants"]:
             grantee = grant.get("Grantee", {})
             if grantee.get("URI") == "http://acs.amazonaws.com/groups/global/AllUsers":
-                findings["ACL_Public"] = True
+                return {"ACL_Public": True}
     except ClientError:
         pass
+    return {}
 
-    # Check Encryption
+def check_encryption(s3_client, bucket_name):
     try:
         enc = s3_client.get_bucket_encryption(Bucket=bucket_name)
         rules = enc["ServerSideEncryptionConfiguration"]["Rules"]
         if rules:
-            findings["Encryption"] = "Enabled"
+            return {"Encryption": "Enabled"}
     except ClientError:
-        findings["Encryption"] = "Disabled"
+        pass
+    return {"Encryption": "Disabled"}
 
-    # Check Versioning
+def check_versioning(s3_client, bucket_name):
     try:
         versioning = s3_client.get_bucket_versioning(Bucket=bucket_name)
         if versioning.get("Status") == "Enabled":
-            findings["Versioning"] = "Enabled"
+            return {"Versioning": "Enabled"}
     except ClientError:
         pass
+    return {}
 
-    # Check Logging
+def check_logging(s3_client, bucket_name):
     try:
         logging = s3_client.get_bucket_logging(Bucket=bucket_name)
         if logging.get("LoggingEnabled"):
-            findings["Logging"] = "Enabled"
+            return {"Logging": "Enabled"}
     except ClientError:
         pass
+    return {}
+
+# Each check is one independent API call
+CHECKS = (check_policy_status, check_public_access_block, check_acl,
+          check_encryption, check_versioning, check_logging)
+
+def check_bucket_security(bucket_name, s3_client):
+    findings = {
+        "Bucket": bucket_name,
+        "PublicAccessBlock": "Unknown",
+        "ACL_Public": False,
+        "Policy_Public": False,
+        "Encryption": "Disabled",
+        "Versioning": "Disabled",
+        "Logging": "Disabled",
+        "Severity": "Low"
+    }
+
+    # Run the checks side by side; each returns the fields it determined
+    with ThreadPoolExecutor(max_workers=CHECK_WORKERS) as ex:
+        for result in ex.map(lambda check: check(s3_client, bucket_name), CHECKS):
+            findings.update(result)
 
     # Assign Severity
     if findings["ACL_Public"] or findings["Policy_Public"] or findings["Encryption"] == "Disabled":
@@ -74,7 +99,7 @@ def check_bucket_security(bucket_name, s3_client):
 
 def main():
     session = boto3.Session()
-    s3_client = session.client("s3")
+    s3_client = session.client("s3", config=BOTO_CONFIG)
 
     # Get all buckets
     buckets = s3_client.list_buckets().get("Buckets", [])
@@ -89,7 +114,7 @@ def main():
 
     # Save results to CSV
     if all_findings:
-        with open("s3_bucket_security_report.csv", "w", newline="", encoding="utf-8") as f:
+        with open("s3_bucket_security_report.csv", "w", newline="", buffering=CSV_BUFFER_SIZE, encoding="utf-8") as f:
             writer = csv.DictWriter(f, fieldnames=all_findings[0].keys())
             writer.writeheader()
             writer.writerows(all_findings)
@@ -5,38 +5,106 @@ python3  s3_full_inventory.py
 Produce S3 inventory of all buckets + per-bucket metadata (region, encryption, versioning, lifecycle, ACL/public)
 python3 --version
 aws configure     Enter AWS Access Key, Secret Key, and default region.
-pip install boto3 pandas openpyxl
+pip install boto3 pandas pyarrow openpyxl
 
 Outputs:
   - s3_objects_<timestamp>.csv   (all objects)
-  - s3_inventory_<timestamp>.xlsx (sheet: Buckets, sheet: Objects)
+  - s3_buckets_<timestamp>.parquet, s3_objects_<timestamp>.parquet (zstd)
+  - s3_inventory_<timestamp>.xlsx (only with --xlsx; sheet: Buckets, sheet: Objects)
 Notes:
   - Gracefully handles permissions/empty configs and continues.
 """
 
+import argparse
 import boto3
 import botocore
+import csv
 import pandas as pd
-from datetime import datetime
+import pyarrow as pa
+import pyarrow.parquet as pq
+import json
+import openpyxl
+import random
+import threading
+import time
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from functools import partial
 from collections import defaultdict
 import traceback
 
 TIMESTAMP = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
 OBJECTS_CSV = f"s3_objects_{TIMESTAMP}.csv"
 WORKBOOK_XLSX = f"s3_inventory_{TIMESTAMP}.xlsx"
+BUCKETS_PARQUET = f"s3_buckets_{TIMESTAMP}.parquet"
+OBJECTS_PARQUET = f"s3_objects_{TIMESTAMP}.parquet"
+CSV_BUFFER_SIZE = 4 * 1024 * 1024  # Fewer, larger write syscalls
+
+# Pool sized above the worker count; adaptive retries absorb S3 throttling
+BOTO_CONFIG = Config(
+    max_pool_connections=64,
+    retries={"max_attempts": 15, "mode": "adaptive"},
+)
+# Error codes that mean "slow down" rather than a real failure
+THROTTLE_CODES = {"Throttling", "ThrottlingException", "RequestLimitExceeded", "SlowDown", "TooManyRequestsException"}
+THROTTLE_RETRIES = 5  # Extra attempts in safe_call once botocore's own retries are exhausted
+THROTTLE_BACKOFF_CAP = 20  # Seconds
+MAX_WORKERS = 32  # Buckets scanned concurrently
+METADATA_WORKERS = 7  # Per-bucket metadata calls issued concurrently
+PAGE_SIZE = 1000  # ListObjectsV2 returns at most 1000 keys per page
+PARQUET_ROW_GROUP_ROWS = 100_000  # Object rows buffered per Parquet row group
+
+# Object rows are streamed to disk, so the Parquet schema is fixed up front
+OBJECT_SCHEMA = pa.schema([
+    ("BucketName", pa.string()),
+    ("Key", pa.string()),
+    ("SizeBytes", pa.int64()),
+    ("SizeMB", pa.float64()),
+    ("LastModified", pa.timestamp("us", tz="UTC")),
+    ("StorageClass", pa.dictionary(pa.int32(), pa.string())),  # few distinct values
+    ("ETag", pa.string()),
+    ("SSE", pa.struct([
+        ("SSEAlgorithm", pa.string()),
+        ("SSEKMSKeyId", pa.string()),
+        ("SSECustomerAlgorithm", pa.string()),
+    ])),
+])
+OBJECT_FIELDS = OBJECT_SCHEMA.names
 
 session = boto3.Session()  # will pick up env/profile/role
-s3 = session.client("s3")
-s3res = session.resource("s3")
+s3 = session.client("s3", config=BOTO_CONFIG)
+
+# One client per bucket region avoids a cross-region redirect on every call
+REGIONAL_CONFIG = BOTO_CONFIG.merge(Config(s3={"addressing_style": "virtual"}))
+_region_clients = {}
+_region_clients_lock = threading.Lock()  # session.client() is not thread-safe
+
+def s3_client_for(region):
+    if not region:
+        return s3
+    with _region_clients_lock:
+        if region not in _region_clients:
+            _region_clients[region] = session.client("s3", region_name=region, config=REGIONAL_CONFIG)
+        return _region_clients[region]
+
+def throttle_backoff(attempt):
+    # Exponential backoff with full jitter
+    time.sleep(random.uniform(0, min(THROTTLE_BACKOFF_CAP, 2 ** attempt)))
 
 def safe_call(fn, *args, **kwargs):
-    try:
-        return fn(*args, **kwargs)
-    except botocore.exceptions.ClientError as e:
-        code = e.response.get("Error", {}).get("Code")
-        return {"_error": str(e), "_code": code}
-    except Exception as e:
-        return {"_error": str(e)}
+    # Throttling is retried with backoff so it never masquerades as "no config"
+    for attempt in range(THROTTLE_RETRIES + 1):
+        try:
+            return fn(*args, **kwargs)
+        except botocore.exceptions.ClientError as e:
+            code = e.response.get("Error", {}).get("Code")
+            if code in THROTTLE_CODES and attempt < THROTTLE_RETRIES:
+                throttle_backoff(attempt)
+                continue
+            return {"_error": str(e), "_code": code}
+        except Exception as e:
+            return {"_error": str(e)}
 
 def get_bucket_region(bucket_name):
     resp = safe_call(s3.get_bucket_location, Bucket=bucket_name)
@@ -47,10 +115,12 @@ def get_bucket_region(bucket_name):
     if loc is None:
         return "us-east-1", None
     # Some regions return like 'EU' for eu-west-1 historically; handle gracefully
+    if loc == "EU":
+        return "eu-west-1", None
     return loc, None
 
-def get_bucket_encryption(bucket_name):
-    resp = safe_call(s3.get_bucket_encryption, Bucket=bucket_name)
+def get_bucket_encryption(bucket_name, client=s3):
+    resp = safe_call(client.get_bucket_encryption, Bucket=bucket_name)
     if isinstance(resp, dict) and resp.get("_error"):
         return None, resp
     rules = resp.get("ServerSideEncryptionConfiguration", {}).get("Rules", [])
@@ -63,22 +133,22 @@ def get_bucket_encryption(bucket_name):
         algos.append({"Algorithm": algo, "KMSKeyId": kms})
     return algos or None, None
 
-def get_bucket_versioning(bucket_name):
-    resp = safe_call(s3.get_bucket_versioning, Bucket=bucket_name)
+def get_bucket_versioning(bucket_name, client=s3):
+    resp = safe_call(client.get_bucket_versioning, Bucket=bucket_name)
     if isinstance(resp, dict) and resp.get("_error"):
         return None, resp
     # resp may contain Status: Enabled | Suspended and MFADelete
     return resp, None
 
-def get_bucket_lifecycle(bucket_name):
-    resp = safe_call(s3.get_bucket_lifecycle_configuration, Bucket=bucket_name)
+def get_bucket_lifecycle(bucket_name, client=s3):
+    resp = safe_call(client.get_bucket_lifecycle_configuration, Bucket=bucket_name)
     if isinstance(resp, dict) and resp.get("_error"):
         # If no lifecycle -> error code NoSuchLifecycleConfiguration usually
         return None, resp
     return resp.get("Rules", []), None
 
-def get_bucket_acl(bucket_name):
-    resp = safe_call(s3.get_bucket_acl, Bucket=bucket_name)
+def get_bucket_acl(bucket_name, client=s3):
+    resp = safe_call(client.get_bucket_acl, Bucket=bucket_name)
     if isinstance(resp, dict) and resp.get("_error"):
         return None, resp
     # Basic analysis: is any grant to AllUsers / AuthenticatedUsers
@@ -92,60 +162,218 @@ def get_bucket_acl(bucket_name):
             break
     return {"Grants": grants, "Owner": resp.get("Owner"), "Public": public}, None
 
-def get_bucket_policy_status(bucket_name):
-    resp = safe_call(s3.get_bucket_policy_status, Bucket=bucket_name)
+def get_bucket_policy_status(bucket_name, client=s3):
+    resp = safe_call(client.get_bucket_policy_status, Bucket=bucket_name)
     if isinstance(resp, dict) and resp.get("_error"):
         return None, resp
     return resp.get("PolicyStatus"), None
 
-def get_public_access_block(bucket_name):
-    resp = safe_call(s3.get_public_access_block, Bucket=bucket_name)
+def get_public_access_block(bucket_name, client=s3):
+    resp = safe_call(client.get_public_access_block, Bucket=bucket_name)
     if isinstance(resp, dict) and resp.get("_error"):
         return None, resp
     return resp.get("PublicAccessBlockConfiguration"), None
 
-def get_object_lock_config(bucket_name):
-    resp = safe_call(s3.get_object_lock_configuration, Bucket=bucket_name)
+def get_object_lock_config(bucket_name, client=s3):
+    resp = safe_call(client.get_object_lock_configuration, Bucket=bucket_name)
     if isinstance(resp, dict) and resp.get("_error"):
         return None, resp
     return resp.get("ObjectLockConfiguration"), None
 
-def list_all_objects(bucket_name):
-    paginator = s3.get_paginator("list_objects_v2")
-    page_iter = paginator.paginate(Bucket=bucket_name)
-    for page in page_iter:
-        for obj in page.get("Contents", []):
-            yield obj
-
-def object_has_sse(bucket_name, key):
-    # We will attempt a head_object to read SSE headers - this is best-effort and may be S3:GetObject required
+def excel_value(v):
+    # openpyxl cells take scalars only: drop tz info, serialise nested objects
+    if isinstance(v, (dict, list)):
+        return json.dumps(v, default=str)
+    if isinstance(v, datetime) and v.tzinfo is not None:
+        return v.astimezone(timezone.utc).replace(tzinfo=None)
+    return v
+
+def write_sheet(wb, title, df, index=None):
+    # Stream a DataFrame into a write-only worksheet, missing cells as None
+    ws = wb.create_sheet(title, index)
+    ws.append(list(df.columns))
+    for row in df.astype(object).where(df.notna(), None).itertuples(index=False, name=None):
+        ws.append([excel_value(v) for v in row])
+
+def write_parquet(df, path):
+    # Bucket configs map to Parquet structs/lists; if they are too irregular
+    # for one schema, store the nested cells as JSON text instead
     try:
-        hd = s3.head_object(Bucket=bucket_name, Key=key)
-        sse = {
-            "SSEAlgorithm": hd.get("ServerSideEncryption"),
-            "SSEKMSKeyId": hd.get("SSEKMSKeyId"),
-            "SSECustomerAlgorithm": hd.get("SSECustomerAlgorithm")
+        df.to_parquet(path, compression="zstd", engine="pyarrow", index=False)
+    except pa.ArrowException:
+        nested = lambda v: json.dumps(v, default=str) if isinstance(v, (dict, list)) else v
+        df.apply(lambda col: col.map(nested)).to_parquet(path, compression="zstd", engine="pyarrow", index=False)
+
+class ObjectRowWriter:
+    # Thread-safe sink streaming object rows to CSV, Parquet and (optionally) XLSX
+    def __init__(self, csv_file, parquet_writer, worksheet=None):
+        self.csv = csv.DictWriter(csv_file, fieldnames=OBJECT_FIELDS)
+        self.csv.writeheader()
+        self.parquet = parquet_writer
+        self.pending = []  # Arrow tables per page, written as one row group
+        self.pending_rows = 0
+        self.worksheet = worksheet
+        if worksheet is not None:
+            worksheet.append(OBJECT_FIELDS)
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def write(self, rows):
+        if not rows:
+            return
+        table = pa.Table.from_pylist(rows, schema=OBJECT_SCHEMA)
+        with self.lock:
+            self.csv.writerows(rows)
+            self.pending.append(table)
+            self.pending_rows += len(rows)
+            if self.pending_rows >= PARQUET_ROW_GROUP_ROWS:
+                self._flush_parquet(full_groups_only=True)
+            if self.worksheet is not None:
+                for r in rows:
+                    self.worksheet.append([excel_value(r[c]) for c in OBJECT_FIELDS])
+            self.count += len(rows)
+
+    def _flush_parquet(self, full_groups_only=False):
+        # Buffered pages go out as PARQUET_ROW_GROUP_ROWS-row groups instead of
+        # one tiny group per page; any remainder waits for more rows or close()
+        if not self.pending:
+            return
+        table = pa.concat_tables(self.pending)
+        n = table.num_rows
+        if full_groups_only:
+            n -= n % PARQUET_ROW_GROUP_ROWS
+        self.parquet.write_table(table.slice(0, n), row_group_size=PARQUET_ROW_GROUP_ROWS)
+        rest = table.slice(n)
+        self.pending = [rest] if rest.num_rows else []
+        self.pending_rows = rest.num_rows
+
+    def close(self):
+        # Write the last partial row group; call before the ParquetWriter closes
+        with self.lock:
+            self._flush_parquet()
+
+def list_object_pages(bucket_name, client=s3):
+    # Yields each page's Contents list so callers can work page-at-a-time
+    paginator = client.get_paginator("list_objects_v2")
+    page_iter = paginator.paginate(Bucket=bucket_name, PaginationConfig={"PageSize": PAGE_SIZE})
+    for page in page_iter:
+        yield page.get("Contents", [])
+
+def scan_bucket(b, sink):
+    # Returns the bucket row; object rows are flushed to sink page by page
+    name = b["Name"]
+    created = b.get("CreationDate")
+    print(f"Processing bucket: {name}")
+
+    region, err = get_bucket_region(name)
+    if err:
+        # try to continue
+        print(f"  Warning: region lookup failed: {err}")
+    client = s3_client_for(region)
+
+    # The remaining metadata lookups are independent; issue them side by side
+    lookups = (
+        get_bucket_encryption, get_bucket_versioning, get_bucket_lifecycle,
+        get_bucket_acl, get_bucket_policy_status, get_public_access_block,
+        get_object_lock_config,
+    )
+    with ThreadPoolExecutor(max_workers=METADATA_WORKERS) as ex:
+        futures = {ex.submit(fn, name, client): fn for fn in lookups}
+        results = {futures[f]: f.result() for f in as_completed(futures)}
+
+    enc, enc_err = results[get_bucket_encryption]
+    if enc_err:
+        # common: server side encryption configuration not found or access denied
+        enc = None
+
+    ver, ver_err = results[get_bucket_versioning]
+    if ver_err:
+        ver = None
+
+    life, life_err = results[get_bucket_lifecycle]
+    if life_err:
+        life = None
+
+    acl, acl_err = results[get_bucket_acl]
+    if acl_err:
+        acl = None
+
+    policy_status, policy_err = results[get_bucket_policy_status]
+    if policy_err:
+        policy_status = None
+
+    pab, pab_err = results[get_public_access_block]
+    if pab_err:
+        pab = None
+
+    lock_cfg, lock_err = results[get_object_lock_config]
+    if lock_err:
+        lock_cfg = None
+
+    bucket_row = {
+        "BucketName": name,
+        "CreationDate": created,
+        "Region": region,
+        "Encryption": enc,
+        "Versioning": ver,
+        "LifecycleRules": life,
+        "ACL": acl,
+        "PolicyStatus": policy_status,
+        "PublicAccessBlock": pab,
+        "ObjectLockConfiguration": lock_cfg,
+        "TotalObjects": None,
+        "TotalBytes": None,
+    }
+
+    # Objects inherit the bucket default encryption; read it once instead of
+    # issuing a head_object per key
+    sse_info = None
+    if enc:
+        sse_info = {
+            "SSEAlgorithm": enc[0].get("Algorithm"),
+            "SSEKMSKeyId": enc[0].get("KMSKeyId"),
+            "SSECustomerAlgorithm": None,
         }
-        return sse, None
-    except botocore.exceptions.ClientError as e:
-        return None, {"_error": str(e)}
-    except Exception as e:
-        return None, {"_error": str(e)}
 
-def summarize_bucket_objects(bucket_name):
-    total_bytes = 0
+    # One listing pass, a page at a time: totals cover every object,
+    # rows honour the cap and reach the sink one page per write
+    # If you want to limit, set a cutoff like max_objects_per_bucket
+    max_objects_per_bucket = None  # set to an int to limit for testing
     total_objects = 0
+    total_bytes = 0
+    rows_written = 0
     try:
-        paginator = s3.get_paginator("list_objects_v2")
-        for page in paginator.paginate(Bucket=bucket_name):
-            for obj in page.get("Contents", []):
-                total_objects += 1
-                total_bytes += obj.get("Size", 0)
-        return {"TotalObjects": total_objects, "TotalBytes": total_bytes}, None
+        for contents in list_object_pages(name, client):
+            total_objects += len(contents)
+            total_bytes += sum(o.get("Size", 0) for o in contents)
+            if max_objects_per_bucket:
+                contents = contents[:max(0, max_objects_per_bucket - rows_written)]
+
+            sink.write([{
+                "BucketName": name,
+                "Key": obj.get("Key"),
+                "SizeBytes": obj.get("Size"),
+                "SizeMB": round(obj["Size"] / (1024*1024), 4) if obj.get("Size") is not None else None,
+                "LastModified": obj.get("LastModified"),
+                "StorageClass": obj.get("StorageClass", "STANDARD"),
+                "ETag": obj.get("ETag"),
+                "SSE": sse_info,
+            } for obj in contents])
+            rows_written += len(contents)
+        bucket_row["TotalObjects"] = total_objects
+        bucket_row["TotalBytes"] = total_bytes
     except Exception as e:
-        return None, {"_error": str(e)}
+        print(f"  Warning: object listing failed: {e}")
+
+    return bucket_row
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="S3 full inventory")
+    parser.add_argument('--xlsx', action='store_true', help='Also write the Excel workbook (slow for many objects)')
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
     try:
         all_buckets_resp = s3.list_buckets()
     except Exception as e:
@@ -153,110 +381,33 @@ def main():
         return
 
     buckets = all_buckets_resp.get("Buckets", [])
-    bucket_rows = []
-    object_rows = []
-
-    for b in buckets:
-        name = b["Name"]
-        created = b.get("CreationDate")
-        print(f"Processing bucket: {name}")
-
-        region, err = get_bucket_region(name)
-        if err:
-            # try to continue
-            print(f"  Warning: region lookup failed: {err}")
-
-        enc, enc_err = get_bucket_encryption(name)
-        if enc_err:
-            # common: server side encryption configuration not found or access denied
-            enc = None
-
-        ver, ver_err = get_bucket_versioning(name)
-        if ver_err:
-            ver = None
-
-        life, life_err = get_bucket_lifecycle(name)
-        if life_err:
-            life = None
-
-        acl, acl_err = get_bucket_acl(name)
-        if acl_err:
-            acl = None
-
-        policy_status, policy_err = get_bucket_policy_status(name)
-        if policy_err:
-            policy_status = None
-
-        pab, pab_err = get_public_access_block(name)
-        if pab_err:
-            pab = None
-
-        lock_cfg, lock_err = get_object_lock_config(name)
-        if lock_err:
-            lock_cfg = None
-
-        summary, sum_err = summarize_bucket_objects(name)
-        if sum_err:
-            summary = {"TotalObjects": None, "TotalBytes": None}
-
-        bucket_rows.append({
-            "BucketName": name,
-            "CreationDate": created,
-            "Region": region,
-            "Encryption": enc,
-            "Versioning": ver,
-            "LifecycleRules": life,
-            "ACL": acl,
-            "PolicyStatus": policy_status,
-            "PublicAccessBlock": pab,
-            "ObjectLockConfiguration": lock_cfg,
-            "TotalObjects": summary.get("TotalObjects"),
-            "TotalBytes": summary.get("TotalBytes"),
-        })
-
-        # Iterate objects (first N optionally to limit)
-        # If you want to limit, set a cutoff like max_objects_per_bucket
-        max_objects_per_bucket = None  # set to an int to limit for testing
-        obj_count = 0
-        for obj in list_all_objects(name):
-            key = obj.get("Key")
-            size = obj.get("Size")
-            lastmod = obj.get("LastModified")
-            storage = obj.get("StorageClass", "STANDARD")
-            etag = obj.get("ETag")
-            # Try to get SSE info (best-effort)
-            sse, sse_err = object_has_sse(name, key)
-            sse_info = sse if sse else (sse_err or None)
-
-            object_rows.append({
-                "BucketName": name,
-                "Key": key,
-                "SizeBytes": size,
-                "SizeMB": round(size / (1024*1024), 4) if size is not None else None,
-                "LastModified": lastmod,
-                "StorageClass": storage,
-                "ETag": etag,
-                "SSE": sse_info,
-            })
-
-            obj_count += 1
-            if max_objects_per_bucket and obj_count >= max_objects_per_bucket:
-                break
 
-    # Build DataFrames
-    df_buckets = pd.DataFrame(bucket_rows)
-    df_objects = pd.DataFrame(object_rows)
+    # Excel is opt-in with --xlsx; its Objects sheet is streamed like the CSV
+    wb = openpyxl.Workbook(write_only=True) if args.xlsx else None
+    ws_objects = wb.create_sheet("Objects") if wb else None
 
-    # Save CSV for objects (easy large-file)
-    df_objects.to_csv(OBJECTS_CSV, index=False)
+    # Object rows go straight to disk (CSV + Parquet) as buckets are listed
+    with open(OBJECTS_CSV, "w", newline="", buffering=CSV_BUFFER_SIZE, encoding="utf-8") as f, \
+            pq.ParquetWriter(OBJECTS_PARQUET, OBJECT_SCHEMA, compression="zstd") as pw:
+        sink = ObjectRowWriter(f, pw, ws_objects)
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+            bucket_rows = list(ex.map(partial(scan_bucket, sink=sink), buckets))
+        sink.close()
 
-    # Save Excel with two sheets
-    with pd.ExcelWriter(WORKBOOK_XLSX, engine="openpyxl") as writer:
-        df_buckets.to_excel(writer, sheet_name="Buckets", index=False)
-        df_objects.to_excel(writer, sheet_name="Objects", index=False)
-
-    print(f"\nDone. Wrote:\n - {OBJECTS_CSV}\n - {WORKBOOK_XLSX}")
-    print(f"Buckets scanned: {len(df_buckets)}, Objects rows: {len(df_objects)}")
+    # Bucket table is small; build it in memory
+    df_buckets = pd.DataFrame(bucket_rows)
+    if not df_buckets.empty:
+        df_buckets["Region"] = df_buckets["Region"].astype("category")
+    write_parquet(df_buckets, BUCKETS_PARQUET)
+    written = [OBJECTS_CSV, BUCKETS_PARQUET, OBJECTS_PARQUET]
+
+    if wb:
+        write_sheet(wb, "Buckets", df_buckets, index=0)
+        wb.save(WORKBOOK_XLSX)
+        written.append(WORKBOOK_XLSX)
+
+    print("\nDone. Wrote:\n - " + "\n - ".join(written))
+    print(f"Buckets scanned: {len(df_buckets)}, Objects rows: {sink.count}")
 
 if __name__ == "__main__":
     main()
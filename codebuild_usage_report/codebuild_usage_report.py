@@ -24,22 +24,92 @@ Features:
 
 import boto3
 import botocore
-import pandas as pd
 import argparse
+import csv
 import datetime
 import json
+import os
+import queue
 import sys
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+import textwrap
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
 
 # ------------------------ Configuration ------------------------
-RETRY_CONFIG = Config(
-    retries={
-        'max_attempts': 5,
-        'mode': 'standard'
-    }
-)
 MAX_THREADS = 10  # Number of threads for parallel processing
+MAX_ATTEMPTS = 10
+RETRY_MODE = os.environ.get('AWS_RETRY_MODE', 'adaptive')  # adaptive rate-limits the client under throttling
+BATCH_GET_LIMIT = 100  # batch_get_projects / batch_get_builds accept at most 100 names or ids
+DEFAULT_RPS = 20  # CodeBuild requests per second per region (0 = unlimited)
+MB = 1024 * 1024
+MULTIPART_THRESHOLD = 8 * MB  # reports above this are uploaded in parallel parts
+PAGE_QUEUE_SIZE = 4  # list_projects pages (up to 100 names each) buffered ahead of the workers
+METRIC_QUERY_LIMIT = 500  # GetMetricData accepts at most 500 queries per call
+CACHE_DIR = os.path.expanduser('~/.cache/cbreport')  # list_projects cache, one file per account and region
+REPORT_FIELDS = ["ProjectName", "Status", "LastBuildTime", "Region", "SourceType", "EnvironmentImage"]
+_client_lock = threading.Lock()  # Session.client() is not thread-safe
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rps seconds apart and caps how many are in flight.
+
+    CodeBuild throttles per region, so each region scan gets its own limiter.
+    """
+
+    def __init__(self, rps=DEFAULT_RPS, concurrency=MAX_THREADS):
+        self.interval = 1.0 / rps if rps > 0 else 0.0
+        self.next_slot = time.monotonic()
+        self.in_flight = threading.Semaphore(concurrency)
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self.in_flight.acquire()
+        with self._lock:
+            now = time.monotonic()
+            wait = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+        return self
+
+    def __exit__(self, *exc):
+        self.in_flight.release()
+
+
+class ReportWriter:
+    """Appends rows to the CSV and JSON reports as regions produce them."""
+
+    def __init__(self, csv_file, json_file, pretty=False):
+        self._lock = threading.Lock()
+        self._pretty = pretty
+        self._csv_file = open(csv_file, 'w', newline='')
+        self._csv = csv.DictWriter(self._csv_file, fieldnames=REPORT_FIELDS)
+        self._csv.writeheader()
+        self._json_file = open(json_file, 'w')
+        self._json_file.write('[')
+        self.count = 0
+
+    def _json_item(self, row):
+        # Same layout json.dump gives the whole list with / without indent=2
+        if self._pretty:
+            return ('\n' if not self.count else ',\n') + textwrap.indent(json.dumps(row, indent=2, default=str), '  ')
+        return ('' if not self.count else ',') + json.dumps(row, separators=(',', ':'), default=str)
+
+    def write_rows(self, rows):
+        with self._lock:
+            self._csv.writerows(rows)
+            for row in rows:
+                self._json_file.write(self._json_item(row))
+                self.count += 1
+
+    def close(self):
+        self._json_file.write('\n]' if self._pretty and self.count else ']')
+        self._json_file.close()
+        self._csv_file.close()
 
 # ------------------------ Utility Functions ------------------------
 def parse_args():
@@ -50,133 +120,338 @@ def parse_args():
     parser.add_argument('--profile', type=str, help='AWS CLI profile to use')
     parser.add_argument('--output-prefix', type=str, default='codebuild_report', help='Output file prefix')
     parser.add_argument('--threads', type=int, default=MAX_THREADS, help='Max threads for parallel processing')
+    parser.add_argument('--pretty', action='store_true', help='Indent the JSON report (compact by default)')
+    parser.add_argument('--cache-ttl', type=int, default=0,
+                        help='Reuse cached project lists younger than this many seconds (0 = no cache)')
+    parser.add_argument('--allow-partial', action='store_true',
+                        help='Exit 0 even if some regions could not be scanned')
+    parser.add_argument('--use-metrics', action='store_true',
+                        help='Detect recent builds from the CloudWatch Builds metric (day precision)')
+    parser.add_argument('--rps', type=float, default=DEFAULT_RPS, help='Max CodeBuild API requests per second in each region (0 = unlimited)')
     return parser.parse_args()
 
 
-def get_boto3_client(service, region, profile=None):
-    session = boto3.Session(profile_name=profile) if profile else boto3.Session()
-    return session.client(service, region_name=region, config=RETRY_CONFIG)
+def make_config(threads=MAX_THREADS):
+    # One pooled connection per worker thread (botocore defaults to 10)
+    return Config(
+        retries={
+            'max_attempts': MAX_ATTEMPTS,
+            'mode': RETRY_MODE
+        },
+        max_pool_connections=max(threads, 10)
+    )
+
+
+def chunked(seq, n=BATCH_GET_LIMIT):
+    for i in range(0, len(seq), n):
+        yield seq[i:i + n]
+
+
+@lru_cache(maxsize=None)
+def get_session(profile=None):
+    # One session per run: credentials are resolved once
+    return boto3.Session(profile_name=profile) if profile else boto3.Session()
+
+
+@lru_cache(maxsize=None)
+def get_boto3_client(service, region, profile=None, threads=MAX_THREADS):
+    # Clients are thread-safe once built, so one per (service, region) is shared
+    with _client_lock:
+        return get_session(profile).client(service, region_name=region, config=make_config(threads))
+
 
+@lru_cache(maxsize=None)
+def get_account_id(profile=None, region=None):
+    return get_boto3_client('sts', region, profile).get_caller_identity()['Account']
 
-def paginate_list_projects(client):
-    projects = []
-    paginator = client.get_paginator('list_projects')
-    for page in paginator.paginate():
-        projects.extend(page.get('projects', []))
-    return projects
 
+def cache_path(account, region):
+    return os.path.join(CACHE_DIR, f"{account}_{region}.json")
 
-def paginate_list_builds(client, project_name):
-    builds = []
-    paginator = client.get_paginator('list_builds_for_project')
-    for page in paginator.paginate(projectName=project_name):
-        builds.extend(page.get('ids', []))
-    return builds
 
+def load_cached_projects(path, ttl):
+    # Project names from a previous run, or None if missing / older than ttl
+    try:
+        if time.time() - os.path.getmtime(path) < ttl:
+            with open(path) as f:
+                names = json.load(f)
+            if isinstance(names, list):
+                return names
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def save_cached_projects(path, project_names):
+    # Best-effort: the cache is optional, so a write failure only costs the next run a listing
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(project_names, f)
+        os.replace(tmp_path, path)  # atomic, so a concurrent run never reads half a file
+    except OSError as e:
+        print(f"⚠️ Could not write project cache {path}: {e}", file=sys.stderr)
+
+
+def produce_project_pages(client, pages, cache_file=None, cache_ttl=0):
+    # Producer: feeds list_projects pages into the bounded queue, then a None
+    # sentinel. put() blocks while the queue is full, which throttles listing
+    # to the speed of the workers. Listing errors are handed over to be
+    # re-raised; cache read/write problems are absorbed by the cache helpers.
+    try:
+        cached = load_cached_projects(cache_file, cache_ttl) if cache_file else None
+        if cached is not None:
+            for names in chunked(cached):
+                pages.put(names)
+        else:
+            listed = []
+            paginator = client.get_paginator('list_projects')
+            for page in paginator.paginate():
+                page_names = page.get('projects', [])
+                if cache_file:
+                    listed.extend(page_names)
+                for names in chunked(page_names):
+                    pages.put(names)
+            # Only a complete listing is cached
+            if cache_file:
+                save_cached_projects(cache_file, listed)
+    except Exception as e:
+        pages.put(e)
+    pages.put(None)
 
-def get_project_details(client, project_names):
+
+def latest_build_id(client, project_name, limiter):
+    # Newest-first, so the first id of the first page is all we need
+    with limiter:
+        resp = client.list_builds_for_project(projectName=project_name, sortOrder='DESCENDING')
+    ids = resp.get('ids', [])
+    return ids[0] if ids else None
+
+
+def get_project_details(client, project_names, limiter):
     if not project_names:
         return []
-    resp = client.batch_get_projects(names=project_names)
+    with limiter:
+        resp = client.batch_get_projects(names=project_names)
     return resp.get('projects', [])
 
 
-def get_build_details(client, build_ids):
+def get_build_details(client, build_ids, limiter):
     if not build_ids:
         return []
-    resp = client.batch_get_builds(ids=build_ids)
+    with limiter:
+        resp = client.batch_get_builds(ids=build_ids)
     return resp.get('builds', [])
 
 
-def determine_status(last_build_time, days_threshold):
+def determine_status(last_build_time, cutoff):
     if not last_build_time:
         return "EMPTY"
-    now = datetime.datetime.utcnow()
-    diff = now - last_build_time
-    return "USED" if diff.days <= days_threshold else "UNUSED"
-
-
-def process_project(project, client, days_threshold, region):
+    return "USED" if last_build_time >= cutoff else "UNUSED"
+
+
+def day_start(ts):
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def builds_from_metrics(cw_client, project_names, start, end):
+    # {project: start of the latest UTC day with builds} from the AWS/CodeBuild
+    # Builds metric; projects with no builds between start and end are absent
+    latest = {}
+    paginator = cw_client.get_paginator('get_metric_data')
+    for chunk in chunked(project_names, METRIC_QUERY_LIMIT):
+        queries = [{
+            'Id': f"p{i}",
+            'MetricStat': {
+                'Metric': {
+                    'Namespace': 'AWS/CodeBuild',
+                    'MetricName': 'Builds',
+                    'Dimensions': [{'Name': 'ProjectName', 'Value': name}]
+                },
+                'Period': 86400,
+                'Stat': 'Sum'
+            }
+        } for i, name in enumerate(chunk)]
+        for page in paginator.paginate(MetricDataQueries=queries, StartTime=start, EndTime=end,
+                                       ScanBy='TimestampDescending'):
+            for result in page.get('MetricDataResults', []):
+                name = chunk[int(result['Id'][1:])]
+                for ts, value in zip(result.get('Timestamps', []), result.get('Values', [])):
+                    if value > 0:
+                        if name not in latest or ts > latest[name]:
+                            latest[name] = ts
+                        break
+    return latest
+
+
+def safe_latest_build_id(client, project_name, limiter):
     try:
-        project_name = project['name']
-        source_type = project.get('source', {}).get('type', 'NO_SOURCE')
-        env_image = project.get('environment', {}).get('image', None)
-
-        # Get all build IDs
-        build_ids = paginate_list_builds(client, project_name)
-        last_build_time = None
-
-        if build_ids:
-            builds_detail = get_build_details(client, [build_ids[0]])
-            if builds_detail:
-                last_build_str = builds_detail[0].get('startTime')
-                if last_build_str:
-                    last_build_time = last_build_str.replace(tzinfo=None)
-
-        status = determine_status(last_build_time, days_threshold)
-        if status == "EMPTY" and (source_type != "NO_SOURCE" and env_image):
-            status = "UNUSED"
-
-        return {
-            "ProjectName": project_name,
-            "Status": status,
-            "LastBuildTime": last_build_time.isoformat() if last_build_time else "N/A",
-            "Region": region,
-            "SourceType": source_type,
-            "EnvironmentImage": env_image
-        }
+        return project_name, latest_build_id(client, project_name, limiter), True
     except Exception as e:
-        print(f"Error processing project {project.get('name', 'N/A')}: {e}", file=sys.stderr)
-        return None
+        print(f"Error processing project {project_name}: {e}", file=sys.stderr)
+        return project_name, None, False
+
+
+def build_start_times(client, build_ids, limiter):
+    # {projectName: startTime} for one batch_get_builds call
+    return {b['projectName']: b.get('startTime') for b in get_build_details(client, build_ids, limiter)}
+
+
+def project_row(project, last_build_time, cutoff, region):
+    project_name = project['name']
+    # A handful of source types and images repeat across every project: share one copy of each
+    source_type = sys.intern(project.get('source', {}).get('type', 'NO_SOURCE'))
+    env_image = project.get('environment', {}).get('image', None)
+    if env_image:
+        env_image = sys.intern(env_image)
+    status = determine_status(last_build_time, cutoff)
+    if status == "EMPTY" and (source_type != "NO_SOURCE" and env_image):
+        status = "UNUSED"
+
+    return {
+        "ProjectName": project_name,
+        "Status": status,
+        "LastBuildTime": last_build_time.astimezone(datetime.timezone.utc).isoformat() if last_build_time else "N/A",
+        "Region": region,
+        "SourceType": source_type,
+        "EnvironmentImage": env_image
+    }
 
 # ------------------------ Main Logic ------------------------
-def main():
-    args = parse_args()
-    report_data = []
-
-    for region in args.regions:
-        print(f"Scanning region: {region}")
-        client = get_boto3_client('codebuild', region, args.profile)
-
+def process_page(client, project_names, executor, limiter, cutoff, region, cw_client=None, now=None):
+    # Build lookups only need project names, so the page's batch_get_projects
+    # runs on the pool alongside them; then one batch_get_builds for the
+    # page's (at most 100) latest builds
+    details = executor.submit(get_project_details, client, project_names, limiter)
+
+    # With --use-metrics, projects that built recently are settled by one
+    # GetMetricData call and skip the per-project build lookups
+    active = {}
+    if cw_client is not None:
         try:
-            project_names = paginate_list_projects(client)
-            if not project_names:
-                print(f"No CodeBuild projects found in {region}")
-                continue
-
-            projects = get_project_details(client, project_names)
+            active = builds_from_metrics(cw_client, project_names, day_start(cutoff), now)
+        except botocore.exceptions.ClientError as e:
+            # Missing cloudwatch:GetMetricData or throttled: the lookups below cover every project
+            print(f"⚠️ CloudWatch metrics unavailable in {region}, using build lookups: {e}", file=sys.stderr)
+
+    latest_ids = {}
+    failed = set()
+    lookups = [name for name in project_names if name not in active]
+    for name, build_id, ok in executor.map(lambda name: safe_latest_build_id(client, name, limiter), lookups):
+        if not ok:
+            failed.add(name)
+        elif build_id:
+            latest_ids[name] = build_id
+    start_times = build_start_times(client, list(latest_ids.values()), limiter) if latest_ids else {}
+    projects = details.result()
+
+    # Join start times back onto projects by name. Metric times are day
+    # buckets, so they are judged against the day the cutoff falls in
+    rows = []
+    for p in projects:
+        if p['name'] in active:
+            rows.append(project_row(p, active[p['name']], day_start(cutoff), region))
+        elif p['name'] not in failed:
+            rows.append(project_row(p, start_times.get(p['name']), cutoff, region))
+    return rows, failed
+
+
+def scan_region(region, args, sink, now, cutoff):
+    print(f"Scanning region: {region}")
+    client = get_boto3_client('codebuild', region, args.profile, args.threads)
+    cw_client = get_boto3_client('cloudwatch', region, args.profile, args.threads) if args.use_metrics else None
+    limiter = RateLimiter(args.rps, args.threads)
+
+    # Reported in the run's _status.json
+    status = {'ok': True, 'error': None, 'projects': 0, 'failed_projects': []}
+    found = 0
+    producer = None
+    try:
+        cache_file = cache_path(get_account_id(args.profile, region), region) if args.cache_ttl > 0 else None
+
+        # Bounded queue between the list_projects producer and the page worker
+        # below, so memory stays flat however many projects the region has
+        pages = queue.Queue(maxsize=PAGE_QUEUE_SIZE)
+        producer = threading.Thread(target=produce_project_pages,
+                                    args=(client, pages, cache_file, args.cache_ttl), daemon=True)
+        producer.start()
+
+        with ThreadPoolExecutor(max_workers=args.threads) as executor:
+            while True:
+                names = pages.get()
+                if names is None:
+                    break
+                if isinstance(names, Exception):
+                    raise names
+                found += len(names)
+                rows, failed = process_page(client, names, executor, limiter, cutoff, region, cw_client, now)
+                sink.write_rows(rows)
+                status['projects'] += len(rows)
+                status['failed_projects'].extend(sorted(failed))
+        if not found:
+            print(f"No CodeBuild projects found in {region}")
+        # Projects whose build lookup failed are missing from the report
+        if status['failed_projects']:
+            status.update(ok=False, error=f"{len(status['failed_projects'])} project(s) could not be checked")
+
+    except (botocore.exceptions.ClientError, botocore.exceptions.BotoCoreError) as e:
+        print(f"Error accessing region {region}: {e}", file=sys.stderr)
+        status.update(ok=False, error=str(e))
+        # Unblock the producer if it is waiting on a full queue
+        while producer is not None and producer.is_alive():
+            try:
+                pages.get(timeout=0.1)
+            except queue.Empty:
+                pass
+    return status
 
-            # Parallel processing of projects
-            with ThreadPoolExecutor(max_workers=args.threads) as executor:
-                futures = [executor.submit(process_project, p, client, args.days, region) for p in projects]
-                for future in as_completed(futures):
-                    result = future.result()
-                    if result:
-                        report_data.append(result)
 
-        except botocore.exceptions.ClientError as e:
-            print(f"Error accessing region {region}: {e}", file=sys.stderr)
-            continue
+def main():
+    args = parse_args()
 
-    # ------------------------ Save Reports ------------------------
-    timestamp = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+    # One clock reading for the whole run; build start times are tz-aware
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cutoff = now - datetime.timedelta(days=args.days)
+    timestamp = now.strftime("%Y%m%d_%H%M%S")
     csv_file = f"{args.output_prefix}_{timestamp}.csv"
     json_file = f"{args.output_prefix}_{timestamp}.json"
+    status_file = f"{args.output_prefix}_{timestamp}_status.json"
+
+    # Regions are independent: scan them side by side, each with its own
+    # project pool, streaming rows into the reports as pages complete
+    sink = ReportWriter(csv_file, json_file, args.pretty)
+    try:
+        with ThreadPoolExecutor(max_workers=len(args.regions)) as outer:
+            region_status = dict(zip(args.regions,
+                                     outer.map(partial(scan_region, args=args, sink=sink, now=now, cutoff=cutoff), args.regions)))
+    finally:
+        sink.close()
 
-    df = pd.DataFrame(report_data)
-    df.to_csv(csv_file, index=False)
-    with open(json_file, 'w') as f:
-        json.dump(report_data, f, indent=2)
+    # ------------------------ Save Reports ------------------------
+    with open(status_file, 'w') as f:
+        json.dump(region_status, f, indent=2)
+    failed_regions = [region for region, status in region_status.items() if not status['ok']]
 
-    print(f"Reports saved: {csv_file}, {json_file}")
+    print(f"Reports saved: {csv_file}, {json_file}, {status_file}")
 
     # Optional S3 upload
     if args.s3_bucket:
-        s3_client = get_boto3_client('s3', args.regions[0], args.profile)
-        s3_client.upload_file(csv_file, args.s3_bucket, csv_file)
-        s3_client.upload_file(json_file, args.s3_bucket, json_file)
+        s3_client = get_boto3_client('s3', args.regions[0], args.profile, args.threads)
+        transfer_config = TransferConfig(multipart_threshold=MULTIPART_THRESHOLD,
+                                         max_concurrency=args.threads, use_threads=True)
+        # Reports go up side by side
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            uploads = [executor.submit(s3_client.upload_file, path, args.s3_bucket, path, Config=transfer_config)
+                       for path in (csv_file, json_file, status_file)]
+            for upload in uploads:
+                upload.result()
         print(f"Reports uploaded to s3://{args.s3_bucket}/")
 
+    if failed_regions:
+        print(f"⚠️ Regions with errors: {', '.join(failed_regions)} (see {status_file})", file=sys.stderr)
+        if not args.allow_partial:
+            sys.exit(1)
     print("✅ CodeBuild usage report completed.")
 
 